@@ -1,47 +1,76 @@
 #!/usr/bin/env python3
 """Bidirektionaler Telegram-Bot als Kommunikationskanal für Claude Code."""
 
-import json
+import atexit
+import codecs
 import os
 import sys
 import asyncio
+import functools
+import hashlib
 import logging
-import subprocess
+import queue
+import secrets
+import shutil
+import signal
 import tempfile
+import time
 import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from io import BytesIO
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
-from dotenv import load_dotenv
+import orjson
+
+try:
+    from gtts import gTTS
+except ImportError:  # /vorlesen meldet dann einen Fehler, der Rest des Bots läuft
+    gTTS = None
+
 from telegram import Update, BotCommand
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     ApplicationHandlerStop,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 from telegram.constants import ChatAction
 
+from lib import env  # noqa: F401  (lädt .env, vor allen os.getenv-Aufrufen)
 from lib.auth import TwoFactorAuth
-from lib.worker import log_request
+from lib.claude_worker import ClaudeWorker, ClaudeWorkerError
+from lib.telegram_text import LONG_MESSAGE_CHARS, ChunkedReply, join_prompts, split_text, stderr_suffix, utf16_len
+from lib.worker import close_client as close_worker_client, log_request
 from lib.rag_integration import RAGIntegration
 from lib.scheduler import TaskScheduler
 from lib.reminders import ReminderManager
 from lib.knowledge_sync import KnowledgeSync
 
-load_dotenv(Path(__file__).parent / ".env")
-
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 ALLOWED_CHAT_ID = int(os.getenv("TELEGRAM_CHAT_ID", "0"))
+# Öffentliche Basis-URL für den Webhook-Modus (leer = Long-Polling)
+WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+WEBHOOK_PORT = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443"))
+WEBHOOK_LISTEN = os.getenv("TELEGRAM_WEBHOOK_LISTEN", "127.0.0.1")
 WORKING_DIR = Path(__file__).parent
+_WORKING_DIR_STR = str(WORKING_DIR)  # cwd für Subprozesse (einmal konvertiert)
 LOG_DIR = WORKING_DIR / "logs"
 LOG_DIR.mkdir(exist_ok=True)
 DATA_DIR = WORKING_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
-SESSIONS_FILE = DATA_DIR / "sessions.json"
+SESSIONS_DIR = DATA_DIR / "sessions"  # Eine Datei pro Agent: <agent_id>.json
+LEGACY_SESSIONS_FILE = DATA_DIR / "sessions.json"  # Altes Format, wird beim Start migriert
+TTS_CACHE_DIR = DATA_DIR / "tts_cache"
+TTS_CACHE_MAX = 200  # Max. gecachte MP3s, älteste werden zuerst gelöscht
+# Temporäre Fotos auf tmpfs ablegen, falls verfügbar (sonst System-Temp-Verzeichnis)
+PHOTO_TMP_DIR = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
 
 # --- Logging Setup ---
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
@@ -50,12 +79,20 @@ LOG_FILE = LOG_DIR / "bot.log"
 log = logging.getLogger("telegram_bridge")
 log.setLevel(logging.INFO)
 
+# Datei-Handler von bot.log; bleibt None, wenn der Logger schon konfiguriert war
+_fh: RotatingFileHandler | None = None
+
 # Nur Handler hinzufügen wenn noch keine vorhanden (verhindert Dopplungen)
 if not log.handlers:
     _formatter = logging.Formatter(LOG_FORMAT)
     _fh = RotatingFileHandler(LOG_FILE, maxBytes=5_000_000, backupCount=3, encoding="utf-8")
     _fh.setFormatter(_formatter)
-    log.addHandler(_fh)
+    # Datei-I/O (inkl. Rotation) im Hintergrund-Thread, Handler im Event-Loop stellen nur in die Queue
+    _log_queue: queue.SimpleQueue = queue.SimpleQueue()  # unbegrenzt, lock-frei in C
+    log.addHandler(QueueHandler(_log_queue))
+    _log_listener = QueueListener(_log_queue, _fh)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
 
 # Root-Logger ruhigstellen (keine doppelten Einträge)
 logging.basicConfig(level=logging.WARNING)
@@ -76,6 +113,58 @@ scheduler: TaskScheduler = None  # Wird in post_init gestartet
 # --- Agenten-System ---
 AGENTS_FILE = WORKING_DIR / "config" / "agents.json"
 ACTIVE_AGENT = {}  # Wird beim Start geladen
+# Pro-Update-Memo für get_active_agent() (wird durch reset_update_memo zurückgesetzt)
+_active_agent_var: ContextVar[dict | None] = ContextVar("active_agent", default=None)
+
+CLAUDE_MAX_RUNTIME = 600  # Safety-Timeout: 10 Minuten max pro Aufruf
+# claude-Binary einmalig auflösen (spart die PATH-Suche bei jedem Prozessstart)
+CLAUDE_BIN = shutil.which("claude")
+if CLAUDE_BIN is None:
+    log.error("claude CLI nicht im PATH gefunden – Claude-Aufrufe werden fehlschlagen")
+    CLAUDE_BIN = "claude"
+# Persistenter Claude-Prozess pro Agent-Session statt Prozess-Start pro Nachricht
+CLAUDE_PERSISTENT = os.getenv("CLAUDE_PERSISTENT", "0") == "1"
+# Obergrenze gleichzeitig laufender Claude-Prozesse (schützt vor RAM-Engpass bei Bursts)
+CLAUDE_MAX_CONCURRENCY = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "2"))
+_claude_sem = asyncio.Semaphore(CLAUDE_MAX_CONCURRENCY)
+# Eigenes Limit für /bash, damit Shell-Befehle keine Claude-Slots belegen
+BASH_MAX_CONCURRENCY = int(os.getenv("BASH_MAX_CONCURRENCY", "4"))
+_bash_sem = asyncio.Semaphore(BASH_MAX_CONCURRENCY)
+# Antwort-Cache für identische Prompts (0 = aus; Sessions sind zustandsbehaftet, daher opt-in)
+CLAUDE_CACHE_TTL = float(os.getenv("CLAUDE_CACHE_TTL", "0"))
+CLAUDE_CACHE_SIZE = 256
+# (agent_id, Prompt-Hash) → (expires, output)
+_response_cache: OrderedDict[tuple[str, bytes], tuple[float, str]] = OrderedDict()
+
+
+def _cache_key(agent_id: str, prompt: str) -> tuple[str, bytes]:
+    return agent_id, hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+
+
+def _cache_invalidate(agent_id: str):
+    """Verwirft alle gecachten Antworten eines Agenten (z.B. nach Session-Reset)."""
+    for key in [k for k in _response_cache if k[0] == agent_id]:
+        del _response_cache[key]
+
+
+def _cache_get(key: tuple[str, bytes]) -> str | None:
+    """Liefert eine gecachte Antwort, solange sie nicht abgelaufen ist."""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del _response_cache[key]
+        return None
+    _response_cache.move_to_end(key)
+    return entry[1]
+
+
+def _cache_put(key: tuple[str, bytes], output: str):
+    """Speichert eine Antwort (LRU, max CLAUDE_CACHE_SIZE Einträge)."""
+    _response_cache[key] = (time.monotonic() + CLAUDE_CACHE_TTL, output)
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > CLAUDE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
 
 # --- Claude Queue (Warteschlange statt Kill) ---
 class ClaudeQueue:
@@ -93,6 +182,7 @@ class ClaudeQueue:
         self._last_completed: dict[str, datetime] = {}    # agent_id → letzter Abschluss
         self._job_counter: int = 0                         # Fortlaufende Job-ID
         self._history: list[dict] = []                     # Alle Jobs (max 50)
+        self._claude_workers: dict[str, tuple[str, ClaudeWorker]] = {}  # agent_id → (session_id, Worker)
 
     def _ensure_queue(self, agent_id: str):
         """Stellt sicher dass Queue und Worker für Agent existieren."""
@@ -126,13 +216,15 @@ class ClaudeQueue:
         log.info("📋 Queue [%s]: Job eingereiht (Position %d, Typ=%s, Prompt='%s...')",
                  agent_id, position, job_type, prompt[:50])
 
-        # Worker starten falls noch keiner läuft
+        self._ensure_worker(agent_id)
+        return position
+
+    def _ensure_worker(self, agent_id: str):
+        """Startet den Queue-Worker des Agenten, falls noch keiner läuft."""
         if agent_id not in self._workers or self._workers[agent_id].done():
             self._workers[agent_id] = asyncio.create_task(self._worker(agent_id))
             log.info("🔧 Queue [%s]: Worker gestartet", agent_id)
 
-        return position
-
     async def _worker(self, agent_id: str):
         """Endlos-Loop: nimmt Jobs aus Queue und führt sie sequentiell aus."""
         log.info("🔧 Worker [%s] gestartet", agent_id)
@@ -151,10 +243,7 @@ class ClaudeQueue:
                 job["started"] = datetime.now()
                 self._add_history(job)
                 try:
-                    if job["job_type"] == "photo":
-                        await self._execute_photo(agent_id, job)
-                    else:
-                        await self._execute_claude(agent_id, job)
+                    await self._execute(agent_id, job)
                     self._stats[agent_id] = self._stats.get(agent_id, 0) + 1
                     self._last_completed[agent_id] = datetime.now()
                     job["status"] = "✅"
@@ -174,6 +263,10 @@ class ClaudeQueue:
                     await self._notify_next(agent_id)
         finally:
             self._workers.pop(agent_id, None)
+            # Idle-GC: persistenten Claude-Prozess nicht über die Leerlaufzeit hinaus halten
+            entry = self._claude_workers.pop(agent_id, None)
+            if entry:
+                await entry[1].stop()
             log.info("🔧 Worker [%s] beendet", agent_id)
 
     async def _notify_next(self, agent_id: str):
@@ -182,50 +275,38 @@ class ClaudeQueue:
             remaining = self._queues[agent_id].qsize()
             log.info("📋 Queue [%s]: %d Job(s) warten noch", agent_id, remaining)
 
-    async def _execute_claude(self, agent_id: str, job: dict):
-        """Führt einen Claude-Job aus (Text/Freitext)."""
+    async def _execute(self, agent_id: str, job: dict):
+        """Führt einen Claude-Job aus (Text/Freitext oder Bildanalyse) und sendet die Antwort."""
         prompt = job["prompt"]
         agent = job["agent"]
         chat_id = job["chat_id"]
         message = job["message"]
+        is_photo = job["job_type"] == "photo"
+        label = "Bildanalyse" if is_photo else "Claude"
 
         typing = TypingLoop(message.chat)
         typing.start()
-        start = datetime.now()
-        proc = None
+        reply = job["reply"] = ChunkedReply(message.reply_text)
+        start = time.perf_counter()
         try:
-            cmd = build_claude_cmd(prompt, agent, chat_id)
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=str(WORKING_DIR),
-            )
-            job["proc"] = proc
-            job["start"] = start
-
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    proc.communicate(), timeout=CLAUDE_MAX_RUNTIME
-                )
+                output = await self._invoke(agent_id, job)
             except asyncio.TimeoutError:
-                proc.kill()
-                await proc.wait()
-                elapsed = (datetime.now() - start).total_seconds()
-                log.error("⏱️ Claude [%s] TIMEOUT nach %.0fs – Prozess gekillt (PID %d)", agent_id, elapsed, proc.pid)
-                await message.reply_text(
-                    f"⏱️ Claude hat nach {int(elapsed)}s nicht geantwortet und wurde gestoppt.\n"
-                    f"Tipp: /newsession für eine frische Konversation."
-                )
+                elapsed = time.perf_counter() - start
+                log.error("⏱️ %s [%s] TIMEOUT nach %.0fs – Prozess gekillt", label, agent_id, elapsed)
+                if is_photo:
+                    await message.reply_text(f"⏱️ Bildanalyse Timeout nach {int(elapsed)}s.")
+                else:
+                    await message.reply_text(
+                        f"⏱️ Claude hat nach {int(elapsed)}s nicht geantwortet und wurde gestoppt.\n"
+                        f"Tipp: /newsession für eine frische Konversation."
+                    )
                 return
 
-            elapsed = (datetime.now() - start).total_seconds()
-            output = stdout.decode().strip()
-            if stderr.decode().strip():
-                output += f"\n\n--- STDERR ---\n{stderr.decode().strip()}"
-            log.info("Claude [%s] fertig in %.1fs (%d Zeichen)", agent_id, elapsed, len(output))
+            elapsed = time.perf_counter() - start
+            log.info("%s [%s] fertig in %.1fs (%d Zeichen)", label, agent_id, elapsed, len(output))
             if elapsed > 120:
-                log.warning("⚠️ Claude [%s] langsam: %.1fs", agent_id, elapsed)
+                log.warning("⚠️ %s [%s] langsam: %.1fs", label, agent_id, elapsed)
 
             try:
                 rag.store_interaction(
@@ -237,80 +318,143 @@ class ClaudeQueue:
             except Exception as e:
                 log.warning("RAG-Speichern fehlgeschlagen: %s", e)
 
-            if not output.strip():
-                await message.reply_text("(keine Ausgabe)")
-            else:
-                for i in range(0, len(output), 4000):
-                    await message.reply_text(output[i:i+4000])
+            await reply.finish(output)
         except FileNotFoundError:
             log.error("claude CLI nicht gefunden")
             await message.reply_text("Fehler: 'claude' CLI nicht gefunden. Ist Claude Code installiert?")
         finally:
+            tmp_path = job.get("tmp_path")
+            if tmp_path:
+                tmp_path.unlink(missing_ok=True)
             typing.stop()
 
-    async def _execute_photo(self, agent_id: str, job: dict):
-        """Führt einen Bildanalyse-Job aus."""
-        prompt = job["prompt"]
-        agent = job["agent"]
-        chat_id = job["chat_id"]
-        message = job["message"]
-        tmp_path = job.get("tmp_path")
-
-        typing = TypingLoop(message.chat)
-        typing.start()
-        start = datetime.now()
-        proc = None
+    async def _invoke(self, agent_id: str, job: dict) -> str:
+        """Führt den Prompt eines Jobs aus und gibt die Ausgabe zurück.
+
+        Nutzt den persistenten Claude-Prozess (CLAUDE_PERSISTENT=1) oder startet
+        einen einmaligen Prozess. Identische Text-Prompts werden bei aktivem
+        CLAUDE_CACHE_TTL aus dem Antwort-Cache bedient. Maximal CLAUDE_MAX_CONCURRENCY Aufrufe laufen
+        gleichzeitig (agentübergreifend). Bei Timeout wird der Prozess gekillt
+        und `asyncio.TimeoutError` weitergereicht.
+        """
+        key = None
+        if CLAUDE_CACHE_TTL > 0 and job["job_type"] == "text":
+            key = _cache_key(agent_id, job["prompt"])
+            cached = _cache_get(key)
+            if cached is not None:
+                log.info("💾 Claude [%s] Antwort aus Cache (%d Zeichen)", agent_id, len(cached))
+                return cached
+
+        async with _claude_sem:
+            output = await self._invoke_unbounded(agent_id, job)
+        if key is not None and output:
+            _cache_put(key, output)
+        return output
+
+    async def _invoke_unbounded(self, agent_id: str, job: dict) -> str:
+        prompt, agent, chat_id = job["prompt"], job["agent"], job["chat_id"]
+        if CLAUDE_PERSISTENT:
+            try:
+                worker = await self._get_worker(agent_id, agent)
+                context = _rag_context(prompt, agent, chat_id)
+                text = f"{context}\n\n{prompt}" if context else prompt
+                return await worker.ask(text, timeout=CLAUDE_MAX_RUNTIME)
+            except (ClaudeWorkerError, OSError) as e:
+                if getattr(e, "delivered", False):
+                    # Prompt lief bereits (inkl. Tool-Aufrufe) – nicht erneut ausführen
+                    log.error("🧵 Claude-Worker [%s] Fehler nach Zustellung: %s", agent_id, e)
+                    raise
+                # Worker wird beim nächsten Job neu gestartet; dieser Job läuft einmalig
+                log.warning("🧵 Claude-Worker [%s] ausgefallen, Fallback auf Einzelprozess: %s", agent_id, e)
+
+        cmd = build_claude_cmd(prompt, agent, chat_id)
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=_WORKING_DIR_STR,
+        )
+        job["proc"] = proc
         try:
-            cmd = build_claude_cmd(prompt, agent, chat_id)
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=str(WORKING_DIR),
+            stdout, stderr = await asyncio.wait_for(
+                self._read_output(proc, job.get("reply")), timeout=CLAUDE_MAX_RUNTIME
             )
-            job["proc"] = proc
-            job["start"] = start
-
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    proc.communicate(), timeout=CLAUDE_MAX_RUNTIME
-                )
-            except asyncio.TimeoutError:
-                proc.kill()
-                await proc.wait()
-                elapsed = (datetime.now() - start).total_seconds()
-                log.error("⏱️ Bildanalyse [%s] TIMEOUT nach %.0fs – gekillt", agent_id, elapsed)
-                await message.reply_text(f"⏱️ Bildanalyse Timeout nach {int(elapsed)}s.")
-                return
-
-            elapsed = (datetime.now() - start).total_seconds()
-            output = stdout.decode().strip()
-            if stderr.decode().strip():
-                output += f"\n\n--- STDERR ---\n{stderr.decode().strip()}"
-            log.info("Bildanalyse [%s] in %.1fs (%d Zeichen)", agent_id, elapsed, len(output))
-
-            try:
-                rag.store_interaction(
-                    user_message=prompt,
-                    assistant_response=output,
-                    chat_id=chat_id,
-                    model=agent.get("model", "unknown")
-                )
-            except Exception as e:
-                log.warning("RAG-Speichern fehlgeschlagen: %s", e)
-
-            if not output.strip():
-                await message.reply_text("(keine Ausgabe)")
-            else:
-                for i in range(0, len(output), 4000):
-                    await message.reply_text(output[i:i+4000])
-        except FileNotFoundError:
-            log.error("claude CLI nicht gefunden")
-            await message.reply_text("Fehler: 'claude' CLI nicht gefunden. Ist Claude Code installiert?")
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        return stdout.strip() + stderr_suffix(stderr)
+
+    @staticmethod
+    async def _read_output(proc, reply: "ChunkedReply | None") -> tuple[str, bytes]:
+        """Liest stdout inkrementell (volle Teile gehen sofort an `reply`), stderr parallel.
+
+        stdout wird dabei genau einmal dekodiert und als Text zurückgegeben.
+        """
+        stderr_task = asyncio.create_task(proc.stderr.read())
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parts: list[str] = []
+        try:
+            while chunk := await proc.stdout.read(65536):
+                text = decoder.decode(chunk)
+                parts.append(text)
+                if reply is not None:
+                    await reply.feed(text)
+            parts.append(decoder.decode(b"", final=True))
+            stderr = await stderr_task
         finally:
-            if tmp_path:
-                tmp_path.unlink(missing_ok=True)
-            typing.stop()
+            stderr_task.cancel()
+        await proc.wait()
+        if reply is not None:
+            reply.set_stderr(stderr)
+        return "".join(parts), stderr
+
+    async def _get_worker(self, agent_id: str, agent: dict) -> ClaudeWorker:
+        """Liefert den laufenden Claude-Worker des Agenten, startet ihn bei Bedarf neu.
+
+        Ein Worker gehört zu genau einer Session – nach Session-Rotation oder
+        /newsession wird der alte Prozess beendet.
+        """
+        session_id, is_new = get_session_info(agent_id)
+        entry = self._claude_workers.get(agent_id)
+        if entry and entry[0] == session_id and entry[1].alive:
+            return entry[1]
+        if entry:
+            await entry[1].stop()
+        worker = ClaudeWorker(build_claude_worker_cmd(agent, session_id, is_new), WORKING_DIR)
+        await worker.start()
+        self._claude_workers[agent_id] = (session_id, worker)
+        return worker
+
+    async def prewarm(self, agent_id: str, agent: dict):
+        """Startet den Claude-Worker vorab, damit die erste Nachricht keinen Kaltstart bezahlt.
+
+        Nur für bestehende Sessions mit Transcript: eine neue Session-ID würde
+        ohne Prompt nie angelegt, nach einem Neustart liefe `--resume` ins Leere.
+        Der Queue-Worker wird mitgestartet, damit dessen Leerlauf-Timeout auch
+        einen vorgestarteten Prozess ohne Jobs wieder beendet.
+        """
+        session_id = load_sessions().get(agent_id)
+        transcript = _session_transcript_path(session_id) if session_id else None
+        try:
+            usable = transcript is not None and transcript.stat().st_size <= MAX_SESSION_SIZE_MB * 1024 * 1024
+        except FileNotFoundError:
+            usable = False
+        if not usable:
+            log.info("🧵 Claude-Worker [%s] nicht vorgestartet (keine fortsetzbare Session)", agent_id)
+            return
+        try:
+            await self._get_worker(agent_id, agent)
+        except (ClaudeWorkerError, OSError) as e:
+            log.warning("🧵 Claude-Worker [%s] konnte nicht vorgestartet werden: %s", agent_id, e)
+            return
+        self._ensure_queue(agent_id)
+        self._ensure_worker(agent_id)
+
+    async def stop_claude_workers(self):
+        """Beendet alle persistenten Claude-Prozesse (Bot-Shutdown)."""
+        entries, self._claude_workers = list(self._claude_workers.values()), {}
+        await asyncio.gather(*(worker.stop() for _, worker in entries), return_exceptions=True)
 
     def _add_history(self, job: dict):
         """Fügt Job zur History hinzu (max 50 Einträge)."""
@@ -381,29 +525,71 @@ class ClaudeQueue:
 claude_queue = ClaudeQueue()
 
 
+_AGENTS_CACHE = {"stat": None, "data": None}  # (mtime_ns, size) → geparste agents.json
+
+
 def load_agents() -> dict:
-    """Lädt die Agenten-Konfiguration aus agents.json."""
-    if not AGENTS_FILE.exists():
-        return {"default": "assistant", "agents": {}}
-    with open(AGENTS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Lädt die Agenten-Konfiguration aus agents.json.
+
+    Das Ergebnis wird gecacht und nur neu eingelesen, wenn sich
+    mtime oder Größe der Datei ändern (Hot-Reload bleibt erhalten).
+    """
+    try:
+        st = AGENTS_FILE.stat()
+    except FileNotFoundError:
+        if _AGENTS_CACHE["stat"] != "missing":
+            _AGENTS_CACHE["stat"] = "missing"
+            _AGENTS_CACHE["data"] = {"default": "assistant", "agents": {}}
+        return _AGENTS_CACHE["data"]
+
+    key = (st.st_mtime_ns, st.st_size)
+    if _AGENTS_CACHE["stat"] == key:
+        return _AGENTS_CACHE["data"]
+    data = orjson.loads(AGENTS_FILE.read_bytes())
+    _AGENTS_CACHE["stat"] = key
+    _AGENTS_CACHE["data"] = data
+    return data
+
+
+_ACTIVE_AGENT_RESOLVED: tuple | None = None  # (agent_id, agents.json-Stat, aufgelöster Agent)
 
 
 def get_active_agent() -> dict:
-    """Gibt den aktiven Agenten zurück."""
+    """Gibt den aktiven Agenten zurück (einmal pro Update aufgelöst)."""
+    agent = _active_agent_var.get()
+    if agent is None:
+        agent = _resolve_active_agent()
+        _active_agent_var.set(agent)
+    return agent
+
+
+def _resolve_active_agent() -> dict:
+    """Ermittelt den aktiven Agenten aus agents.json.
+
+    Das Ergebnis bleibt über Updates hinweg gültig, bis sich ACTIVE_AGENT["id"]
+    oder agents.json ändert. Aufrufer dürfen das Dict nicht verändern.
+    """
+    global _ACTIVE_AGENT_RESOLVED
     config = load_agents()
+    key = (ACTIVE_AGENT.get("id"), _AGENTS_CACHE["stat"])
+    if _ACTIVE_AGENT_RESOLVED is not None and _ACTIVE_AGENT_RESOLVED[:2] == key:
+        return _ACTIVE_AGENT_RESOLVED[2]
+    agent = _lookup_agent(config)
+    _ACTIVE_AGENT_RESOLVED = (*key, agent)
+    return agent
+
+
+def _lookup_agent(config: dict) -> dict:
+    """Sucht den aktiven Agenten in der geparsten agents.json."""
     agent_id = ACTIVE_AGENT.get("id", config.get("default", "assistant"))
     agents = config.get("agents", {})
+    # Kopie zurückgeben – das Dict in _AGENTS_CACHE darf nicht mutiert werden
     if agent_id in agents:
-        agent = agents[agent_id]
-        agent["id"] = agent_id
-        return agent
+        return {**agents[agent_id], "id": agent_id}
     # Fallback: erster Agent oder leer
     if agents:
         first_id = next(iter(agents))
-        agent = agents[first_id]
-        agent["id"] = first_id
-        return agent
+        return {**agents[first_id], "id": first_id}
     return {"id": "default", "name": "Standard", "emoji": "\U0001f916", "system_prompt": "", "model": "opus"}
 
 
@@ -411,18 +597,91 @@ MCP_CONFIG_FILE = WORKING_DIR / "config" / "mcp_config.json"
 
 
 # --- Session-Verwaltung ---
+# Session-IDs im Speicher (einmal von Platte geladen); "dirty" = Agents mit ungeschriebenen Änderungen
+_SESSIONS_CACHE = {"data": None, "dirty": set(), "timer": None}
+SESSIONS_FLUSH_DELAY = 1.0  # Sekunden, Schreibzugriffe innerhalb des Fensters werden gebündelt
+
+
+def _session_file(agent_id: str) -> Path:
+    return SESSIONS_DIR / f"{agent_id}.json"
+
+
+def _migrate_sessions_file():
+    """Einmalige Migration: data/sessions.json in eine Datei pro Agent aufteilen."""
+    if not LEGACY_SESSIONS_FILE.exists():
+        return
+    sessions = orjson.loads(LEGACY_SESSIONS_FILE.read_bytes())
+    for agent_id, session_id in sessions.items():
+        _write_session_file(agent_id, session_id)
+    LEGACY_SESSIONS_FILE.unlink()
+    log.info("sessions.json migriert: %d Session(s) nach %s", len(sessions), SESSIONS_DIR)
+
+
+def _write_session_file(agent_id: str, session_id: str):
+    """Schreibt die Session-ID eines Agenten atomar (tmp-Datei + os.replace)."""
+    path = _session_file(agent_id)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_bytes(orjson.dumps({"session_id": session_id}))
+    os.replace(tmp, path)
+
+
 def load_sessions() -> dict:
-    """Lädt die Session-IDs aus data/sessions.json."""
-    if not SESSIONS_FILE.exists():
-        return {}
-    with open(SESSIONS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Gibt die Session-IDs aller Agenten zurück (agent_id → session_id).
+
+    Beim ersten Aufruf werden die Dateien in data/sessions/ gelesen, danach
+    dient der Speicher als Quelle. Zurückgegeben wird eine Kopie, damit
+    Aufrufer sie vor save_sessions() verändern dürfen.
+    """
+    if _SESSIONS_CACHE["data"] is None:
+        SESSIONS_DIR.mkdir(exist_ok=True)
+        _migrate_sessions_file()
+        data = {}
+        for path in SESSIONS_DIR.glob("*.json"):
+            try:
+                data[path.stem] = orjson.loads(path.read_bytes())["session_id"]
+            except (ValueError, KeyError, OSError) as e:
+                log.warning("Session-Datei %s unlesbar: %s", path.name, e)
+        _SESSIONS_CACHE["data"] = data
+    return dict(_SESSIONS_CACHE["data"])
 
 
 def save_sessions(sessions: dict):
-    """Speichert die Session-IDs in data/sessions.json."""
-    with open(SESSIONS_FILE, "w", encoding="utf-8") as f:
-        json.dump(sessions, f, indent=2)
+    """Übernimmt die Session-IDs in den Cache und plant das Schreiben der geänderten Agents.
+
+    Mehrere Änderungen innerhalb von SESSIONS_FLUSH_DELAY landen in einem
+    Schreibvorgang. Ohne laufenden Event-Loop wird sofort geschrieben.
+    """
+    old = _SESSIONS_CACHE["data"] or {}
+    _SESSIONS_CACHE["dirty"].update(
+        agent_id for agent_id in old.keys() | sessions.keys()
+        if old.get(agent_id) != sessions.get(agent_id)
+    )
+    _SESSIONS_CACHE["data"] = dict(sessions)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_sessions()
+        return
+    if _SESSIONS_CACHE["timer"] is None:
+        _SESSIONS_CACHE["timer"] = loop.call_later(SESSIONS_FLUSH_DELAY, flush_sessions)
+
+
+def flush_sessions():
+    """Schreibt bzw. löscht die Session-Dateien aller geänderten Agents."""
+    timer = _SESSIONS_CACHE["timer"]
+    if timer is not None:
+        timer.cancel()
+        _SESSIONS_CACHE["timer"] = None
+    dirty, _SESSIONS_CACHE["dirty"] = _SESSIONS_CACHE["dirty"], set()
+    data = _SESSIONS_CACHE["data"] or {}
+    for agent_id in dirty:
+        if agent_id in data:
+            _write_session_file(agent_id, data[agent_id])
+        else:
+            _session_file(agent_id).unlink(missing_ok=True)
+
+
+atexit.register(flush_sessions)
 
 
 MAX_SESSION_SIZE_MB = 5  # Session-Transcript > 5 MB → automatisch rotieren
@@ -455,6 +714,8 @@ def get_session_info(agent_id: str) -> tuple[str, bool]:
     """Gibt (session_id, is_new) für einen Agenten zurück.
 
     Rotiert automatisch wenn das Transcript > MAX_SESSION_SIZE_MB ist.
+    Bewusst synchron: ohne await-Punkt läuft Lesen → Erzeugen → Speichern
+    atomar im Event-Loop, parallele Updates können keine zwei IDs vergeben.
     """
     sessions = load_sessions()
 
@@ -476,6 +737,7 @@ def get_session_info(agent_id: str) -> tuple[str, bool]:
 def reset_session(agent_id: str) -> bool:
     """Löscht die Session-ID für einen Agenten. Gibt True zurück wenn gelöscht."""
     sessions = load_sessions()
+    _cache_invalidate(agent_id)  # Antworten der alten Session nicht wiederverwenden
     if agent_id in sessions:
         old_id = sessions.pop(agent_id)
         save_sessions(sessions)
@@ -484,21 +746,21 @@ def reset_session(agent_id: str) -> bool:
     return False
 
 
-def build_claude_cmd(prompt: str, agent: dict = None, chat_id: str = None) -> list:
-    """Baut den Claude-CLI-Befehl mit Agent-System-Prompt, RAG-Kontext und MCP Playwright."""
-    if agent is None:
-        agent = get_active_agent()
-    agent_id = agent.get("id", "default")
-    session_id, is_new = get_session_info(agent_id)
-    if is_new:
-        cmd = ["claude", "--print", "--session-id", session_id, "--dangerously-skip-permissions"]
-    else:
-        cmd = ["claude", "--print", "--resume", session_id, "--dangerously-skip-permissions"]
-    # MCP Playwright SSE-Server einbinden (persistente Session auf Port 8931)
-    if MCP_CONFIG_FILE.exists():
-        cmd += ["--mcp-config", str(MCP_CONFIG_FILE)]
+# Prozessweit konstante CLI-Optionen, einmalig beim Import ermittelt.
+# MCP Playwright SSE-Server einbinden (persistente Session auf Port 8931)
+_CLAUDE_STATIC_OPTS = ("--dangerously-skip-permissions",) + (
+    ("--mcp-config", str(MCP_CONFIG_FILE)) if MCP_CONFIG_FILE.exists() else ()
+)
+
+
+@functools.lru_cache(maxsize=32)
+def _cmd_options(model: str | None) -> tuple[str, ...]:
+    """Unveränderliche CLI-Optionen pro Modell (einmalig gebaut und gecacht)."""
+    return _CLAUDE_STATIC_OPTS + (("--model", model) if model else ())
 
-    # RAG-Kontext-Anreicherung: Enreichere System-Prompt mit semantischem Memory
+
+def _enrich_system_prompt(prompt: str, agent: dict, chat_id: str = None) -> str:
+    """RAG-Kontext-Anreicherung: Enreichere System-Prompt mit semantischem Memory."""
     system_prompt = agent.get("system_prompt", "")
     if system_prompt:
         try:
@@ -510,16 +772,43 @@ def build_claude_cmd(prompt: str, agent: dict = None, chat_id: str = None) -> li
         except Exception as e:
             log.warning("RAG-Anreicherung fehlgeschlagen: %s", e)
             # Fallback: Verwende ursprünglichen Prompt
+    return system_prompt
+
+
+def _rag_context(prompt: str, agent: dict, chat_id: str = None) -> str:
+    """Nur der RAG-Anteil der Anreicherung (für den persistenten Worker, dessen
+    System-Prompt beim Start festgelegt ist)."""
+    base = agent.get("system_prompt", "")
+    enriched = _enrich_system_prompt(prompt, agent, chat_id)
+    return enriched[len(base):].strip() if enriched.startswith(base) else ""
+
+
+def build_claude_cmd(prompt: str, agent: dict = None, chat_id: str = None) -> list:
+    """Baut den Claude-CLI-Befehl mit Agent-System-Prompt, RAG-Kontext und MCP Playwright."""
+    if agent is None:
+        agent = get_active_agent()
+    agent_id = agent.get("id", "default")
+    session_id, is_new = get_session_info(agent_id)
+    cmd = [CLAUDE_BIN, "--print", "--session-id" if is_new else "--resume", session_id]
+    cmd += _cmd_options(agent.get("model"))
 
+    system_prompt = _enrich_system_prompt(prompt, agent, chat_id)
     if system_prompt:
         cmd += ["--system-prompt", system_prompt]
-    model = agent.get("model")
-    if model:
-        cmd += ["--model", model]
     cmd.append(prompt)
     return cmd
 
 
+def build_claude_worker_cmd(agent: dict, session_id: str, is_new: bool) -> list:
+    """Claude-CLI-Befehl für den persistenten Worker (ohne Prompt, Basis-System-Prompt)."""
+    cmd = [CLAUDE_BIN, "--print", "--session-id" if is_new else "--resume", session_id]
+    cmd += _cmd_options(agent.get("model"))
+    system_prompt = agent.get("system_prompt", "")
+    if system_prompt:
+        cmd += ["--system-prompt", system_prompt]
+    return cmd
+
+
 class TypingLoop:
     """Sendet periodisch ChatAction.TYPING, solange Claude arbeitet."""
 
@@ -545,14 +834,31 @@ class TypingLoop:
             self._task = None
 
 
-def is_authorized(update: Update) -> bool:
-    """Nur autorisierte Chat-ID zulassen."""
-    chat_id = update.effective_chat.id
-    if chat_id != ALLOWED_CHAT_ID:
+async def auth_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Nur autorisierte Chat-ID zulassen (läuft als erster Handler für jedes Update).
+
+    Fremde Chats werden hier einmalig verworfen; die übrigen Handler müssen
+    die Chat-ID nicht mehr selbst prüfen.
+    """
+    chat = update.effective_chat
+    if chat and chat.id != ALLOWED_CHAT_ID:
         user = update.effective_user
-        log.warning("Unautorisierter Zugriff von chat_id=%s user=%s (@%s)", chat_id, user.full_name if user else "?", user.username if user else "?")
-        return False
-    return True
+        log.warning("Unautorisierter Zugriff von chat_id=%s user=%s (@%s)", chat.id, user.full_name if user else "?", user.username if user else "?")
+        raise ApplicationHandlerStop
+
+
+def format_output(stdout: bytes, stderr: bytes) -> str:
+    """Dekodiert stdout/stderr eines Prozesses (je genau einmal) zu einem Antworttext.
+
+    Ungültige UTF-8-Sequenzen werden ersetzt statt einen UnicodeDecodeError auszulösen.
+    """
+    return stdout.decode(errors="replace").strip() + stderr_suffix(stderr)
+
+
+def command_args(update: Update) -> str:
+    """Argument-Text eines Kommandos direkt aus der Nachricht (Zeilenumbrüche und Abstände bleiben erhalten)."""
+    parts = (update.message.text or "").split(maxsplit=1)
+    return parts[1] if len(parts) > 1 else ""
 
 
 async def split_send(update: Update, text: str):
@@ -560,19 +866,25 @@ async def split_send(update: Update, text: str):
     if not text.strip():
         await update.message.reply_text("(keine Ausgabe)")
         return
-    for i in range(0, len(text), 4000):
-        chunk = text[i : i + 4000]
+    if utf16_len(text) <= 4000:  # Häufigster Fall: eine Nachricht, kein Splitten
+        await update.message.reply_text(text)
+        return
+    # Bewusst sequenziell: parallele Sends würden die Teil-Reihenfolge im Chat
+    # nicht garantieren; das Pacing übernimmt der AIORateLimiter.
+    for chunk in split_text(text):
         await update.message.reply_text(chunk)
 
 
+async def reset_update_memo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Setzt Pro-Update-Caches zurück (läuft vor allen anderen Handlern)."""
+    _active_agent_var.set(None)
+
+
 async def cmd_2fa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Neuen 2FA-Code anfordern."""
     log.info("[/2fa] Eingang von @%s (chat_id=%s)", update.effective_user.username, update.effective_chat.id)
-    if not is_authorized(update):
-        log.info("[/2fa] Abgelehnt: nicht autorisiert")
-        return
     log.info("[/2fa] Generiere und sende neuen 2FA-Code...")
-    if tfa.generate_and_send():
+    if await asyncio.to_thread(tfa.generate_and_send):
         log.info("[/2fa] Code gesendet, warte auf Eingabe")
         await update.message.reply_text("Neuer 2FA-Code wurde per E-Mail gesendet. Bitte eingeben:")
     else:
@@ -582,13 +894,10 @@ async def cmd_2fa(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_2fa_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Prüft 2FA-Code-Eingabe (höchste Priorität, Gruppe -1)."""
-    log.info("[2FA-Check] Eingang von @%s", update.effective_user.username)
-    if not is_authorized(update):
-        log.info("[2FA-Check] Abgelehnt: nicht autorisiert")
-        return
+    # Schneller Ausstieg im Normalbetrieb (vor jedem Logging/Attributzugriff)
     if tfa.verified:
-        log.info("[2FA-Check] Bereits verifiziert, weiter an Handler")
         return
+    log.info("[2FA-Check] Eingang von @%s", update.effective_user.username)
 
     text = (update.message.text or "").strip()
     if not text:
@@ -609,52 +918,54 @@ async def handle_2fa_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
         raise ApplicationHandlerStop
 
 
+# Hilfe-Text für /start (nur Agent-Emoji und -Name variieren)
+_START_TEMPLATE = (
+    "Claude Code Telegram Bridge aktiv.\n"
+    "Aktiver Agent: {emoji} {name}\n\n"
+    "--- Agenten ---\n"
+    "/agent <name> - Agent wechseln\n"
+    "/agents - Alle Agenten anzeigen\n\n"
+    "--- Claude ---\n"
+    "/claude <nachricht> - Nachricht senden\n"
+    "Freitext / Foto - Direkt an Agent\n\n"
+    "--- Tools ---\n"
+    "/vorlesen <text> - Text als Audio vorlesen\n"
+    "(auch als Reply auf eine Nachricht)\n\n"
+    "--- System ---\n"
+    "/bash <befehl> - Shell ausführen\n"
+    "/newsession - Frische Konversation\n"
+    "/2fa - Neuen 2FA-Code anfordern\n"
+    "/status - Bot-Status\n"
+    "/restart - Bot neustarten"
+)
+
+
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    log.info("[/start] Eingang von @%s (chat_id=%s)", update.effective_user.username, update.effective_chat.id)
-    if not is_authorized(update):
-        log.info("[/start] Abgelehnt: nicht autorisiert")
-        return
+    username = update.effective_user.username
+    log.info("[/start] Eingang von @%s (chat_id=%s)", username, update.effective_chat.id)
     if not tfa.verified:
         log.info("[/start] Abgelehnt: 2FA nicht verifiziert")
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
     agent = get_active_agent()
     log.info("[/start] Agent=%s, sende Hilfe-Nachricht", agent.get("name", "?"))
-    await log_request(update.effective_user.username, "/start", "", agent.get("name", "?"))
+    await log_request(username, "/start", "", agent.get("name", "?"))
     await update.message.reply_text(
-        f"Claude Code Telegram Bridge aktiv.\n"
-        f"Aktiver Agent: {agent.get('emoji', '')} {agent.get('name', '?')}\n\n"
-        "--- Agenten ---\n"
-        "/agent <name> - Agent wechseln\n"
-        "/agents - Alle Agenten anzeigen\n\n"
-        "--- Claude ---\n"
-        "/claude <nachricht> - Nachricht senden\n"
-        "Freitext / Foto - Direkt an Agent\n\n"
-        "--- Tools ---\n"
-        "/vorlesen <text> - Text als Audio vorlesen\n"
-        "(auch als Reply auf eine Nachricht)\n\n"
-        "--- System ---\n"
-        "/bash <befehl> - Shell ausführen\n"
-        "/newsession - Frische Konversation\n"
-        "/2fa - Neuen 2FA-Code anfordern\n"
-        "/status - Bot-Status\n"
-        "/restart - Bot neustarten"
+        _START_TEMPLATE.format(emoji=agent.get("emoji", ""), name=agent.get("name", "?"))
     )
 
 
 async def cmd_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bot neu starten über start.sh."""
-    log.info("[/restart] Eingang von @%s", update.effective_user.username)
-    if not is_authorized(update):
-        log.info("[/restart] Abgelehnt: nicht autorisiert")
-        return
+    username = update.effective_user.username
+    log.info("[/restart] Eingang von @%s", username)
     if not tfa.verified:
         log.info("[/restart] Abgelehnt: 2FA nicht verifiziert")
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
 
     log.info("[/restart] Starte Bot neu...")
-    await log_request(update.effective_user.username, "/restart", "", "System")
+    await log_request(username, "/restart", "", "System")
     await update.message.reply_text("Bot wird neu gestartet...")
 
     start_script = WORKING_DIR / "start.sh"
@@ -662,55 +973,83 @@ async def cmd_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Fehler: start.sh nicht gefunden!")
         return
 
-    # start.sh als losgelösten Prozess starten — es killt den aktuellen Bot und startet neu
-    subprocess.Popen(
+    # start.sh als losgelösten Prozess starten — es killt den aktuellen Bot und startet neu.
+    # posix_spawn statt Popen: kein fork() des (großen) Bot-Prozesses im Event-Loop.
+    # start.sh arbeitet mit absoluten Pfaden, daher ist kein cwd nötig.
+    os.posix_spawn(
+        "/bin/bash",
         ["/bin/bash", str(start_script)],
-        cwd=str(WORKING_DIR),
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True,
+        os.environ,
+        file_actions=[
+            (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+            (os.POSIX_SPAWN_DUP2, 1, 2),
+        ],
+        setsid=True,
     )
     log.info("start.sh gestartet, Bot wird gleich beendet...")
 
 
+def _log_size() -> int:
+    """Aktuelle Größe von bot.log aus der Dateiposition des Handlers (kein stat()).
+
+    Ohne Handler-Lock: der QueueListener-Thread kann ihn währenddessen für einen
+    langsamen write() halten. Die Position des Dateideskriptors kommt per lseek
+    ohne Python-Locks; noch gepufferte Bytes fehlen – für die Anzeige egal.
+    """
+    stream = _fh.stream if _fh is not None else None
+    if stream is not None:
+        try:
+            return os.lseek(stream.fileno(), 0, os.SEEK_CUR)
+        except (OSError, ValueError):
+            pass  # Stream gerade geschlossen (Rotation)
+    try:
+        return LOG_FILE.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+# /status-Antwort; Working Dir und Log-Pfad sind fest und werden einmalig eingesetzt
+_STATUS_TEMPLATE = (
+    "Bot läuft.\n"
+    "Agent: {emoji} {name} ({id})\n"
+    "Chat-ID: {chat_id}\n"
+    f"Working Dir: {WORKING_DIR}\n"
+    f"Log: {LOG_FILE} ({{log_kb:.1f}} KB)\n"
+    "2FA: verifiziert\n\n"
+    "{queue}\n\n"
+    "{reminders}\n\n"
+    "{sync}\n\n"
+    "{scheduler}"
+)
+
+
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    log.info("[/status] Eingang von @%s", update.effective_user.username)
-    if not is_authorized(update):
-        log.info("[/status] Abgelehnt: nicht autorisiert")
-        return
+    username = update.effective_user.username
+    log.info("[/status] Eingang von @%s", username)
     if not tfa.verified:
         log.info("[/status] Abgelehnt: 2FA nicht verifiziert")
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
-    log_size = LOG_FILE.stat().st_size if LOG_FILE.exists() else 0
+    log_size = _log_size()
     agent = get_active_agent()
     log.info("[/status] Agent=%s, Log=%.1fKB", agent.get("name", "?"), log_size / 1024)
-    await log_request(update.effective_user.username, "/status", "", agent.get("name", "?"))
+    await log_request(username, "/status", "", agent.get("name", "?"))
     log.info("[/status] Antwort gesendet")
     scheduler_info = scheduler.get_status() if scheduler else "Scheduler: nicht initialisiert"
     reminder_info = reminder_mgr.get_stats()
     sync_info = knowledge_sync.get_sync_status()
     queue_info = claude_queue.get_status()
-    await update.message.reply_text(
-        f"Bot läuft.\n"
-        f"Agent: {agent.get('emoji', '')} {agent.get('name', '?')} ({agent.get('id', '?')})\n"
-        f"Chat-ID: {update.effective_chat.id}\n"
-        f"Working Dir: {WORKING_DIR}\n"
-        f"Log: {LOG_FILE} ({log_size / 1024:.1f} KB)\n"
-        f"2FA: verifiziert\n\n"
-        f"{queue_info}\n\n"
-        f"{reminder_info}\n\n"
-        f"{sync_info}\n\n"
-        f"{scheduler_info}"
-    )
+    await update.message.reply_text(_STATUS_TEMPLATE.format(
+        emoji=agent.get("emoji", ""), name=agent.get("name", "?"), id=agent.get("id", "?"),
+        chat_id=update.effective_chat.id, log_kb=log_size / 1024,
+        queue=queue_info, reminders=reminder_info, sync=sync_info, scheduler=scheduler_info,
+    ))
 
 
 async def cmd_agents(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Verfügbare Agenten auflisten."""
     log.info("[/agents] Eingang von @%s", update.effective_user.username)
-    if not is_authorized(update):
-        log.info("[/agents] Abgelehnt: nicht autorisiert")
-        return
     if not tfa.verified:
         log.info("[/agents] Abgelehnt: 2FA nicht verifiziert")
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
@@ -729,10 +1068,8 @@ async def cmd_agents(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_agent(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Agent wechseln."""
-    log.info("[/agent] Eingang von @%s", update.effective_user.username)
-    if not is_authorized(update):
-        log.info("[/agent] Abgelehnt: nicht autorisiert")
-        return
+    username = update.effective_user.username
+    log.info("[/agent] Eingang von @%s", username)
     if not tfa.verified:
         log.info("[/agent] Abgelehnt: 2FA nicht verifiziert")
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
@@ -754,42 +1091,40 @@ async def cmd_agent(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     ACTIVE_AGENT["id"] = agent_id
+    _active_agent_var.set(None)
     agent = agents[agent_id]
     log.info("Agent gewechselt zu: %s (%s)", agent_id, agent.get("name"))
-    await log_request(update.effective_user.username, "/agent", agent_id, agent.get("name", "?"))
+    await log_request(username, "/agent", agent_id, agent.get("name", "?"))
     await update.message.reply_text(
         f"{agent.get('emoji', '')} Agent gewechselt: {agent.get('name', agent_id)}\n"
         f"Rolle: {agent.get('system_prompt', '')[:200]}"
     )
 
 
-CLAUDE_MAX_RUNTIME = 600  # Safety-Timeout: 10 Minuten max pro Aufruf
-
-
 ## _run_claude_background und _kill_old_claude entfernt – ersetzt durch ClaudeQueue
 
 
 async def cmd_claude(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Nachricht an Claude Code senden (asynchron im Hintergrund)."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
 
-    prompt = " ".join(context.args) if context.args else ""
+    prompt = command_args(update)
     if not prompt:
         await update.message.reply_text("Verwendung: /claude <deine Nachricht>")
         return
 
     agent = get_active_agent()
-    log.info("CMD /claude [%s] von %s: %s", agent["id"], update.effective_user.username, prompt[:100])
-    await log_request(update.effective_user.username, "/claude", prompt, agent.get("name", "?"))
+    username = update.effective_user.username
+    log.info("CMD /claude [%s] von %s: %s", agent["id"], username, prompt[:100])
+    await log_request(username, "/claude", prompt, agent.get("name", "?"))
 
     # Job in Warteschlange einreihen
     chat_id = str(update.message.chat_id)
     agent_id = agent.get("id", "default")
     title = f"/claude: {prompt[:60]}"
+    await _flush_pending(chat_id)  # Vorher gesendeter Freitext behält seinen Platz in der Queue
     position = await claude_queue.enqueue(agent_id, prompt, agent, chat_id, update.message, title=title)
     if position == 0:
         await update.message.reply_text("⏳ Claude läuft...")
@@ -799,35 +1134,43 @@ async def cmd_claude(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_bash(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shell-Befehl ausführen."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
 
-    command = " ".join(context.args) if context.args else ""
+    command = command_args(update)
     if not command:
         await update.message.reply_text("Verwendung: /bash <befehl>")
         return
 
-    log.info("CMD /bash von %s: %s", update.effective_user.username, command[:100])
-    await log_request(update.effective_user.username, "/bash", command, "System")
+    username = update.effective_user.username
+    log.info("CMD /bash von %s: %s", username, command[:100])
+    await log_request(username, "/bash", command, "System")
     typing = TypingLoop(update.message.chat)
     typing.start()
 
     try:
-        start = datetime.now()
-        proc = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=str(WORKING_DIR),
-        )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=120)
-        elapsed = (datetime.now() - start).total_seconds()
-        output = stdout.decode().strip()
-        if stderr.decode().strip():
-            output += f"\n\n--- STDERR ---\n{stderr.decode().strip()}"
+        start = time.perf_counter()
+        async with _bash_sem:
+            proc = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=_WORKING_DIR_STR,
+                start_new_session=True,  # eigene Prozessgruppe: Timeout beendet auch Kindprozesse
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=120)
+            except asyncio.TimeoutError:
+                # Slot erst freigeben, wenn die Shell wirklich beendet ist
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+                raise
+        elapsed = time.perf_counter() - start
+        output = format_output(stdout, stderr)
         log.info("Bash fertig in %.1fs (exit=%d, %d Zeichen)", elapsed, proc.returncode, len(output))
         await split_send(update, output)
     except asyncio.TimeoutError:
@@ -840,31 +1183,40 @@ async def cmd_bash(update: Update, context: ContextTypes.DEFAULT_TYPE):
         typing.stop()
 
 
-## _run_photo_analysis_background entfernt – ersetzt durch ClaudeQueue._execute_photo
+## _run_photo_analysis_background entfernt – ersetzt durch ClaudeQueue._execute
 
 
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Foto empfangen, speichern und von Claude analysieren lassen (asynchron)."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
 
+    # Höchste Auflösung nehmen (letztes Element in der Liste);
+    # getFile läuft parallel zu Agent-Auflösung und Request-Logging
+    photo = update.message.photo[-1]
+
     caption = update.message.caption or "Analysiere dieses Bild detailliert. Beschreibe was du siehst."
-    log.info("Foto von %s (caption: %s)", update.effective_user.username, caption[:100])
+    username = update.effective_user.username
+    log.info("Foto von %s (caption: %s)", username, caption[:100])
     agent = get_active_agent()
-    await log_request(update.effective_user.username, "Foto", caption, agent.get("name", "?"))
-
-    # Höchste Auflösung nehmen (letztes Element in der Liste)
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
+    file, _ = await asyncio.gather(
+        photo.get_file(),
+        log_request(username, "Foto", caption, agent.get("name", "?")),
+    )
 
-    # Bild in temporäre Datei speichern
-    tmp_path = WORKING_DIR / f"_tmp_photo_{update.message.message_id}.jpg"
+    # Bild in temporäre Datei auf tmpfs speichern (RAM statt Disk)
+    tmp_path = None
     try:
-        await file.download_to_drive(str(tmp_path))
-        log.info("Foto gespeichert: %s (%d bytes)", tmp_path, tmp_path.stat().st_size)
+        with tempfile.NamedTemporaryFile(
+            dir=PHOTO_TMP_DIR, prefix=f"_tmp_photo_{update.message.message_id}_",
+            suffix=".jpg", delete=False,
+        ) as f:
+            tmp_path = Path(f.name)
+            # Direkt in die Datei schreiben, ohne Zwischenpuffer im Speicher
+            await file.download_to_memory(f)
+            size = f.tell()
+        log.info("Foto gespeichert: %s (%d bytes)", tmp_path, size)
 
         prompt = (
             f"Lies die Bilddatei '{tmp_path}' mit dem Read-Tool und analysiere sie. "
@@ -875,6 +1227,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id = str(update.message.chat_id)
         agent_id = agent.get("id", "default")
         title = f"📷 Bild: {caption[:50]}"
+        await _flush_pending(chat_id)  # Vorher gesendeter Freitext behält seinen Platz in der Queue
         position = await claude_queue.enqueue(
             agent_id, prompt, agent, chat_id, update.message,
             job_type="photo", tmp_path=tmp_path, title=title
@@ -886,13 +1239,23 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         log.exception("Fehler beim Foto-Download: %s", e)
         await update.message.reply_text(f"Fehler beim Foto-Download: {e}")
-        tmp_path.unlink(missing_ok=True)
+        if tmp_path:
+            tmp_path.unlink(missing_ok=True)
+
+
+# --- Nachrichten-Bündelung ---
+# Zeitfenster, in dem Folge-Nachrichten zu einem Claude-Aufruf zusammengefasst werden (0 = aus).
+# Verzögert jeden Freitext um dieses Fenster; /claude und Fotos leeren den Puffer vorher,
+# damit die Reihenfolge der Prompts in der Session erhalten bleibt.
+COALESCE_WINDOW = float(os.getenv("MESSAGE_COALESCE_MS", "300")) / 1000
+# Längeres Fenster nach fast vollen Nachrichten (vom Client gesplittete lange Texte)
+COALESCE_WINDOW_LONG = float(os.getenv("MESSAGE_COALESCE_LONG_MS", "2000")) / 1000
+_pending_text: dict[str, dict] = {}  # chat_id → gesammelte Prompts, Agent, letzte Message, Timer
+_flush_tasks: set[asyncio.Task] = set()  # Referenzen halten, bis die Flush-Tasks fertig sind
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Freitext-Nachrichten direkt an Claude Code weiterleiten (asynchron im Hintergrund)."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         # 2FA-Check wird in handle_2fa_check (Gruppe -1) behandelt
         return
@@ -902,37 +1265,81 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Reminder-Erkennung (vor Claude-Call, als Side-Effect)
+    # Bestätigung wird mit der Queue-Antwort in einer Nachricht gesendet (ein API-Call)
+    reminder_notice = ""
     if reminder_mgr.detect_reminder(prompt):
         try:
             r = reminder_mgr.parse_and_store(prompt, str(update.message.chat_id))
             if r:
-                from datetime import datetime as dt_cls
-                due = dt_cls.fromisoformat(r["due_date"]).strftime("%d.%m.%Y %H:%M")
-                await update.message.reply_text(
-                    f"🔔 Erinnerung gespeichert für {due}\n({r['text'][:80]})"
-                )
+                due = datetime.fromisoformat(r["due_date"]).strftime("%d.%m.%Y %H:%M")
+                reminder_notice = f"🔔 Erinnerung gespeichert für {due}\n({r['text'][:80]})\n\n"
         except Exception as e:
             log.warning("Reminder-Erkennung fehlgeschlagen: %s", e)
 
     agent = get_active_agent()
-    log.info("Freitext [%s] von %s: %s", agent["id"], update.effective_user.username, prompt[:100])
-    await log_request(update.effective_user.username, "Freitext", prompt, agent.get("name", "?"))
+    username = update.effective_user.username
+    log.info("Freitext [%s] von %s: %s", agent["id"], username, prompt[:100])
+    await log_request(username, "Freitext", prompt, agent.get("name", "?"))
 
-    # Job in Warteschlange einreihen
     chat_id = str(update.message.chat_id)
+    # Telegram teilt lange Texte in ~4096-Zeichen-Nachrichten → auf die Fortsetzung warten
+    window = COALESCE_WINDOW_LONG if len(prompt) >= LONG_MESSAGE_CHARS else COALESCE_WINDOW
+    if window <= 0 and chat_id not in _pending_text:
+        await _enqueue_text(update.message, agent, prompt, reminder_notice)
+        return
+
+    # Schnell aufeinanderfolgende Nachrichten sammeln und als ein Job einreihen
+    entry = _pending_text.get(chat_id)
+    if entry and entry["agent"].get("id") != agent.get("id"):
+        await _flush_pending(chat_id)
+        entry = None
+    if entry is None:
+        entry = _pending_text[chat_id] = {"prompts": [], "notices": [], "agent": agent, "timer": None}
+    entry["prompts"].append(prompt)
+    entry["notices"].append(reminder_notice)
+    entry["message"] = update.message
+    if entry["timer"]:
+        entry["timer"].cancel()
+    entry["timer"] = asyncio.get_running_loop().call_later(window, _start_flush, chat_id)
+
+
+def _start_flush(chat_id: str):
+    """Timer-Callback: startet das Einreihen der gesammelten Nachrichten."""
+    task = asyncio.create_task(_flush_pending(chat_id))
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+
+
+async def _flush_pending(chat_id: str):
+    """Reiht alle gesammelten Freitext-Nachrichten eines Chats als einen Job ein."""
+    entry = _pending_text.pop(chat_id, None)
+    if entry is None:
+        return
+    if entry["timer"]:
+        entry["timer"].cancel()
+    prompts = entry["prompts"]
+    if len(prompts) > 1:
+        log.info("📎 %d Nachrichten zu einem Claude-Job gebündelt", len(prompts))
+    try:
+        await _enqueue_text(entry["message"], entry["agent"], join_prompts(prompts), "".join(entry["notices"]))
+    except Exception as e:
+        log.exception("Fehler beim Einreihen gebündelter Nachrichten: %s", e)
+
+
+async def _enqueue_text(message, agent: dict, prompt: str, reminder_notice: str = ""):
+    """Reiht einen Freitext-Prompt in die Claude-Queue ein und bestätigt den Eingang."""
+    chat_id = str(message.chat_id)
     agent_id = agent.get("id", "default")
     title = prompt[:60]
-    position = await claude_queue.enqueue(agent_id, prompt, agent, chat_id, update.message, title=title)
+    position = await claude_queue.enqueue(agent_id, prompt, agent, chat_id, message, title=title)
     if position == 0:
-        await update.message.reply_text("⏳ Claude läuft...")
+        await message.reply_text(f"{reminder_notice}⏳ Claude läuft...")
     else:
-        await update.message.reply_text(f"📋 In Warteschlange (Position {position}): \"{title}\"\nDeine Anfrage wird bearbeitet sobald die vorherige fertig ist.")
+        await message.reply_text(f"{reminder_notice}📋 In Warteschlange (Position {position}): \"{title}\"\nDeine Anfrage wird bearbeitet sobald die vorherige fertig ist.")
 
 
 async def cmd_queue(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/queue – Warteschlangen-Status anzeigen."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
@@ -943,16 +1350,15 @@ async def cmd_queue(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_newsession(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Session für aktiven Agenten zurücksetzen (frische Konversation)."""
-    log.info("[/newsession] Eingang von @%s", update.effective_user.username)
-    if not is_authorized(update):
-        return
+    username = update.effective_user.username
+    log.info("[/newsession] Eingang von @%s", username)
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
 
     agent = get_active_agent()
     agent_id = agent.get("id", "default")
-    await log_request(update.effective_user.username, "/newsession", agent_id, agent.get("name", "?"))
+    await log_request(username, "/newsession", agent_id, agent.get("name", "?"))
 
     if reset_session(agent_id):
         await update.message.reply_text(
@@ -965,15 +1371,58 @@ async def cmd_newsession(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+def _tts_cache_path(text: str, lang: str) -> Path:
+    """Cache-Datei für einen TTS-Text (Schlüssel: blake2b des Textes + Sprache)."""
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    return TTS_CACHE_DIR / f"{lang}_{key}.mp3"
+
+
+def _tts_cache_store(path: Path, audio: bytes):
+    """Speichert MP3 atomar und hält den Cache bei max. TTS_CACHE_MAX Dateien."""
+    try:
+        TTS_CACHE_DIR.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(audio)
+        os.replace(tmp, path)
+        files = list(TTS_CACHE_DIR.glob("*.mp3"))
+        if len(files) > TTS_CACHE_MAX:
+            files.sort(key=lambda p: p.stat().st_mtime)
+            for old in files[:len(files) - TTS_CACHE_MAX]:
+                old.unlink(missing_ok=True)
+    except OSError as e:
+        log.warning("TTS-Cache nicht beschreibbar: %s", e)
+
+
+@functools.lru_cache(maxsize=32)
+def _tts_audio(text: str, lang: str) -> bytes:
+    """MP3 für einen Text: Speicher-LRU → Datei-Cache → gTTS (läuft im Worker-Thread)."""
+    cache_path = _tts_cache_path(text, lang)
+    try:
+        audio = cache_path.read_bytes()
+        log.info("TTS aus Cache (%d Zeichen, %d bytes)", len(text), len(audio))
+        return audio
+    except FileNotFoundError:
+        pass
+    if gTTS is None:
+        raise RuntimeError("gTTS ist nicht installiert (pip install gtts)")
+    start = time.perf_counter()
+    audio_buffer = BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(audio_buffer)
+    audio = audio_buffer.getvalue()
+    elapsed = time.perf_counter() - start
+
+    log.info("TTS generiert in %.1fs (%d Zeichen, %d bytes)", elapsed, len(text), len(audio))
+    _tts_cache_store(cache_path, audio)
+    return audio
+
+
 async def cmd_vorlesen(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Text als Audio-Nachricht vorlesen (Text-to-Speech)."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
 
-    text = " ".join(context.args) if context.args else ""
+    text = command_args(update)
 
     # Wenn als Reply auf eine Nachricht → deren Text vorlesen
     if not text and update.message.reply_to_message:
@@ -987,25 +1436,24 @@ async def cmd_vorlesen(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    log.info("CMD /vorlesen von %s: %s", update.effective_user.username, text[:100])
-    await log_request(update.effective_user.username, "/vorlesen", text, "TTS")
-    await update.message.chat.send_action(ChatAction.RECORD_VOICE)
+    username = update.effective_user.username
+    log.info("CMD /vorlesen von %s: %s", username, text[:100])
+    await log_request(username, "/vorlesen", text, "TTS")
+    # Chat-Action parallel zur TTS-Erzeugung senden statt davor zu warten
+    action_task = asyncio.create_task(update.message.chat.send_action(ChatAction.RECORD_VOICE))
 
     try:
-        from gtts import gTTS
-        from io import BytesIO
-
-        start = datetime.now()
-        tts = gTTS(text=text, lang="de")
-        audio_buffer = BytesIO()
-        tts.write_to_fp(audio_buffer)
-        audio_buffer.seek(0)
-        elapsed = (datetime.now() - start).total_seconds()
-
-        log.info("TTS generiert in %.1fs (%d Zeichen, %d bytes)", elapsed, len(text), audio_buffer.getbuffer().nbytes)
-
+        # gTTS macht einen blockierenden HTTPS-Call → im Thread, Event-Loop bleibt frei
+        try:
+            audio = await asyncio.to_thread(_tts_audio, text, "de")
+        except BaseException:
+            action_task.cancel()
+            raise
+        finally:
+            # Chat-Action ist kosmetisch: immer abholen, Fehler nicht weiterreichen
+            await asyncio.gather(action_task, return_exceptions=True)
         await update.message.reply_voice(
-            voice=audio_buffer,
+            voice=audio,
             caption=text[:200] if len(text) > 200 else None,
         )
     except Exception as e:
@@ -1015,8 +1463,6 @@ async def cmd_vorlesen(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_cpu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """/cpu – Claude CPU & Memory Auslastung anzeigen (kein Claude-Aufruf)."""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         return
 
@@ -1037,10 +1483,10 @@ async def cmd_cpu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             cmd,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            cwd=str(WORKING_DIR),
+            cwd=_WORKING_DIR_STR,
         )
         stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=15)
-        output = stdout.decode().strip()
+        output = stdout.decode(errors="replace").strip()
         if not output:
             output = "Keine Claude-Prozesse gefunden."
         await update.message.reply_text(output)
@@ -1060,8 +1506,6 @@ async def cmd_sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
       /sync contacts – Kontakte-Cache in ChromaDB laden
       /sync all     – Alle Quellen synchronisieren
     """
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
@@ -1078,9 +1522,9 @@ async def cmd_sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
         typing = TypingLoop(update.message.chat)
         typing.start()
         try:
-            start = datetime.now()
+            start = time.perf_counter()
             result = knowledge_sync.sync_drive_all()
-            elapsed = (datetime.now() - start).total_seconds()
+            elapsed = time.perf_counter() - start
             msg = (
                 f"✅ Drive-Sync abgeschlossen in {elapsed:.1f}s:\n"
                 f"  📁 Ordnerstruktur: {result.get('structure_lines', 0)} Zeilen\n"
@@ -1153,8 +1597,6 @@ async def cmd_sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_scheduler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Scheduler-Status und Steuerung: /scheduler [status|pause|resume|run <task_id>]"""
-    if not is_authorized(update):
-        return
     if not tfa.verified:
         await update.message.reply_text("Bot ist gesperrt. Bitte 2FA-Code eingeben:")
         return
@@ -1199,27 +1641,40 @@ async def error_handler(update, context):
     log.error("Telegram Fehler: %s", context.error, exc_info=context.error)
 
 
+BOT_COMMANDS = (
+    BotCommand("start", "Bot starten / Hilfe"),
+    BotCommand("agent", "Agent wechseln"),
+    BotCommand("agents", "Agenten auflisten"),
+    BotCommand("claude", "Nachricht an Claude Code"),
+    BotCommand("bash", "Shell-Befehl ausführen"),
+    BotCommand("vorlesen", "Text als Audio vorlesen"),
+    BotCommand("newsession", "Frische Konversation starten"),
+    BotCommand("queue", "Warteschlange anzeigen"),
+    BotCommand("cpu", "Claude CPU & Memory Auslastung"),
+    BotCommand("sync", "Knowledge Base synchronisieren"),
+    BotCommand("scheduler", "Scheduler-Status & Steuerung"),
+    BotCommand("2fa", "Neuen 2FA-Code anfordern"),
+    BotCommand("status", "Bot-Status"),
+    BotCommand("restart", "Bot neu starten"),
+)
+
+# Freitext ohne Kommandos (2FA-Check und Claude-Weiterleitung)
+TEXT_NOT_CMD = filters.TEXT & ~filters.COMMAND
+
+
 async def post_init(application: Application):
     """Bot-Kommandos registrieren, 2FA starten und Scheduler initialisieren."""
-    await application.bot.set_my_commands([
-        BotCommand("start", "Bot starten / Hilfe"),
-        BotCommand("agent", "Agent wechseln"),
-        BotCommand("agents", "Agenten auflisten"),
-        BotCommand("claude", "Nachricht an Claude Code"),
-        BotCommand("bash", "Shell-Befehl ausführen"),
-        BotCommand("vorlesen", "Text als Audio vorlesen"),
-        BotCommand("newsession", "Frische Konversation starten"),
-        BotCommand("queue", "Warteschlange anzeigen"),
-        BotCommand("cpu", "Claude CPU & Memory Auslastung"),
-        BotCommand("sync", "Knowledge Base synchronisieren"),
-        BotCommand("scheduler", "Scheduler-Status & Steuerung"),
-        BotCommand("2fa", "Neuen 2FA-Code anfordern"),
-        BotCommand("status", "Bot-Status"),
-        BotCommand("restart", "Bot neu starten"),
-    ])
+    _use_pidfd_child_watcher()  # vor dem ersten Subprozess (Claude-Worker, Scheduler)
+    await application.bot.set_my_commands(BOT_COMMANDS)
+    # agents.json und Session-IDs vorab laden – die erste Nachricht trifft auf warme Caches
+    agent = _resolve_active_agent()
+    load_sessions()
+    log.info("Aktiver Agent beim Start: %s %s", agent.get("emoji", ""), agent.get("name", agent["id"]))
+    if CLAUDE_PERSISTENT:
+        await claude_queue.prewarm(agent["id"], agent)
     # 2FA-Code generieren und senden
     log.info("Sende 2FA-Code per E-Mail...")
-    if tfa.generate_and_send():
+    if await asyncio.to_thread(tfa.generate_and_send):
         log.info("2FA-Code gesendet. Bot wartet auf Verifizierung.")
     else:
         log.error("2FA-Code konnte nicht gesendet werden! Prüfe SMTP-Einstellungen.")
@@ -1229,8 +1684,7 @@ async def post_init(application: Application):
 
     async def scheduler_send(text: str):
         """Sendet Scheduler-Ergebnisse an den Telegram-Chat."""
-        for i in range(0, len(text), 4000):
-            chunk = text[i: i + 4000]
+        for chunk in split_text(text):
             await application.bot.send_message(
                 chat_id=ALLOWED_CHAT_ID, text=chunk
             )
@@ -1238,23 +1692,70 @@ async def post_init(application: Application):
     scheduler = TaskScheduler(
         build_claude_cmd_fn=build_claude_cmd,
         send_message_fn=scheduler_send,
+        claude_semaphore=_claude_sem,
     )
     scheduler.start()
     log.info("⏰ Scheduler initialisiert und gestartet")
 
 
+def _use_pidfd_child_watcher():
+    """Subprozess-Ende per pidfd statt Watcher-Thread pro Kind erkennen (Linux ≥ 5.3).
+
+    Ab Python 3.12 wählt asyncio pidfd selbst; dort ist die Watcher-API veraltet.
+    Muss im laufenden Loop aufgerufen werden: `set_child_watcher()` hängt den
+    Watcher in 3.11 nicht an einen bereits existierenden Loop, daher explizit
+    `attach_loop()` – sonst scheitert der erste Subprozess mit "not activated".
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(asyncio.get_running_loop())
+    asyncio.set_child_watcher(watcher)
+
+
+async def post_shutdown(application: Application):
+    """Wird beim Beenden des Bots aufgerufen – ausstehende Daten sichern."""
+    flush_sessions()
+    await claude_queue.stop_claude_workers()
+    await close_worker_client()
+
+
 def main():
     if not BOT_TOKEN:
         print("FEHLER: TELEGRAM_BOT_TOKEN nicht in .env gesetzt!")
         return
 
-    app = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    # Ausgehende Nachrichten drosseln (Telegram-Limit ~30 msg/s global, ~20 msg/min pro Gruppe),
+    # 429 wird automatisch wiederholt
+    rate_limiter = AIORateLimiter(
+        overall_max_rate=28, overall_time_period=1,
+        group_max_rate=18, group_time_period=60,
+        max_retries=3,
+    )
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .rate_limiter(rate_limiter)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Error-Handler für Netzwerk- und andere Fehler
     app.add_error_handler(error_handler)
 
+    # Autorisierung vor jeder anderen Verarbeitung (fremde Chats werden sofort verworfen)
+    app.add_handler(TypeHandler(Update, auth_gate), group=-3)
+
+    # Pro-Update-Memos zurücksetzen (vor allen anderen Handlern)
+    app.add_handler(TypeHandler(Update, reset_update_memo), group=-2)
+
     # 2FA-Handler mit höchster Priorität (Gruppe -1)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_2fa_check), group=-1)
+    app.add_handler(MessageHandler(TEXT_NOT_CMD, handle_2fa_check), group=-1)
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("2fa", cmd_2fa))
@@ -1271,11 +1772,27 @@ def main():
     app.add_handler(CommandHandler("scheduler", cmd_scheduler))
     app.add_handler(CommandHandler("sync", cmd_sync))
     app.add_handler(MessageHandler(filters.PHOTO, handle_photo))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(TEXT_NOT_CMD, handle_message))
 
     agent = get_active_agent()
     log.info("=== Bot gestartet === PID=%d, Agent=%s, Chat-ID=%d, Working Dir=%s", os.getpid(), agent["id"], ALLOWED_CHAT_ID, WORKING_DIR)
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        # Webhook: Telegram liefert Updates per Push (kein getUpdates-Long-Polling).
+        # Zufälliger URL-Pfad pro Start; TLS übernimmt der vorgeschaltete Reverse-Proxy/Tunnel.
+        # Telegram sendet secret_token im Header mit, fremde Requests werden abgewiesen.
+        url_path = secrets.token_urlsafe(32)
+        secret_token = os.getenv("TELEGRAM_WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+        log.info("Webhook-Modus: lausche auf %s:%d", WEBHOOK_LISTEN, WEBHOOK_PORT)
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=url_path,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{url_path}",
+            secret_token=secret_token,
+            allowed_updates=[Update.MESSAGE],
+        )
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -1,23 +1,58 @@
 #!/usr/bin/env python3
 """Zwei-Faktor-Authentifizierung per E-Mail für den Telegram-Bot."""
 
+import hmac
 import logging
 import os
 import secrets
 import smtplib
+import threading
+import time
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
-from pathlib import Path
 
-from dotenv import load_dotenv
-
-load_dotenv(Path(__file__).parent.parent / ".env")
+from lib import env  # noqa: F401  (lädt .env)
 
 log = logging.getLogger("telegram_bridge.auth")
 
 SMTP_EMAIL = os.getenv("SMTP_EMAIL", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 
+# Angemeldete SMTP-Verbindung wiederverwenden (spart TCP-/TLS-/AUTH-Handshake bei /2fa)
+_smtp: smtplib.SMTP | None = None
+_smtp_lock = threading.Lock()  # send_2fa_email läuft per asyncio.to_thread in Worker-Threads
+
+
+def _get_smtp() -> smtplib.SMTP:
+    """Liefert eine angemeldete Verbindung; eine vom Server geschlossene wird per NOOP erkannt."""
+    global _smtp
+    if _smtp is not None:
+        try:
+            if _smtp.noop()[0] == 250:
+                return _smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp()
+    server = smtplib.SMTP("smtp.gmail.com", 587, timeout=30)
+    try:
+        server.starttls()
+        server.login(SMTP_EMAIL, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    _smtp = server
+    return server
+
+
+def _close_smtp():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            _smtp.close()
+        _smtp = None
+
 
 def generate_code() -> str:
     """Generiert einen 6-stelligen Zufallscode."""
@@ -43,16 +78,15 @@ def send_2fa_email(code: str, recipient: str = None) -> bool:
     msg["From"] = SMTP_EMAIL
     msg["To"] = recipient
 
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-            server.send_message(msg)
-        log.info("2FA-Code per E-Mail gesendet an %s", recipient)
-        return True
-    except Exception as e:
-        log.exception("Fehler beim Senden der 2FA-E-Mail: %s", e)
-        return False
+    with _smtp_lock:
+        try:
+            _get_smtp().send_message(msg)
+            log.info("2FA-Code per E-Mail gesendet an %s", recipient)
+            return True
+        except Exception as e:
+            _close_smtp()  # Beim nächsten Versuch frisch verbinden
+            log.exception("Fehler beim Senden der 2FA-E-Mail: %s", e)
+            return False
 
 
 class TwoFactorAuth:
@@ -60,23 +94,26 @@ class TwoFactorAuth:
 
     def __init__(self):
         self.code: str = ""
-        self.expires: datetime = datetime.min
+        self.expires: datetime = datetime.min  # nur für Log-Ausgaben
+        self._expires_mono: float = 0.0        # maßgeblich für die Gültigkeit
         self.verified: bool = False
 
     def generate_and_send(self) -> bool:
         """Generiert neuen Code und sendet ihn per E-Mail."""
         self.code = generate_code()
         self.expires = datetime.now() + timedelta(minutes=10)
+        self._expires_mono = time.monotonic() + 600
         self.verified = False
         log.info("Neuer 2FA-Code generiert, gültig bis %s", self.expires.strftime("%H:%M:%S"))
         return send_2fa_email(self.code)
 
     def check_code(self, user_code: str) -> bool:
         """Prüft den eingegebenen Code."""
-        if datetime.now() > self.expires:
+        if time.monotonic() > self._expires_mono:
             log.warning("2FA-Code abgelaufen")
             return False
-        if user_code.strip() == self.code:
+        # Konstante Laufzeit: kein Timing-Rückschluss auf richtige Ziffern
+        if hmac.compare_digest(user_code.strip().encode(), self.code.encode()):
             self.verified = True
             log.info("2FA erfolgreich verifiziert")
             return True
@@ -85,4 +122,4 @@ class TwoFactorAuth:
 
     @property
     def is_expired(self) -> bool:
-        return datetime.now() > self.expires and not self.verified
+        return time.monotonic() > self._expires_mono and not self.verified
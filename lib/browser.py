@@ -6,11 +6,11 @@ eine Python-Schnittstelle bereit, die den Browser persistent hält.
 """
 
 import asyncio
-import base64
 import logging
 import subprocess
 import signal
 import os
+from binascii import a2b_base64
 from pathlib import Path
 
 log = logging.getLogger("telegram_bridge.browser")
@@ -61,7 +61,22 @@ def stop_mcp_server():
 
 
 def is_mcp_running() -> bool:
-    """Prüft ob der MCP Server läuft (Port-Check)."""
+    """Prüft ob der MCP Server läuft.
+
+    Für einen selbst gestarteten Server genügt `poll()` auf dem Prozess (kein
+    Syscall-Roundtrip über TCP); nur bei fremd gestartetem Server wird der Port geprüft.
+    """
+    global MCP_PROCESS
+    if MCP_PROCESS is not None:
+        if MCP_PROCESS.poll() is None:
+            return True
+        log.warning("MCP Server PID=%d beendet (exit=%s)", MCP_PROCESS.pid, MCP_PROCESS.returncode)
+        MCP_PROCESS = None
+    return is_mcp_port_open()
+
+
+def is_mcp_port_open() -> bool:
+    """Prüft ob auf dem MCP-Port ein Server antwortet (Port-Check)."""
     import socket
     try:
         with socket.create_connection(("localhost", MCP_PORT), timeout=2):
@@ -70,18 +85,116 @@ def is_mcp_running() -> bool:
         return False
 
 
-async def mcp_call(tool_name: str, arguments: dict) -> dict:
-    """Ruft ein MCP Tool über HTTP/SSE auf."""
+# Persistente MCP-Client-Session: (Owner-Task, Stop-Event, Session)
+_mcp_session: tuple[asyncio.Task, asyncio.Event, object] | None = None
+_mcp_session_lock = asyncio.Lock()
+
+
+async def _run_mcp_session(ready: asyncio.Future, stop: asyncio.Event):
+    """Hält SSE-Verbindung und ClientSession offen, bis `stop` gesetzt wird.
+
+    Auf- und Abbau laufen im selben Task (anyio-Cancel-Scopes verlangen das).
+    """
     from mcp.client.sse import sse_client
     from mcp import ClientSession
 
     url = f"http://localhost:{MCP_PORT}/sse"
+    try:
+        async with sse_client(url) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                ready.set_result(session)
+                await stop.wait()
+    except Exception as e:
+        if not ready.done():
+            ready.set_exception(e)
+        else:
+            log.warning("MCP-Session beendet: %s", e)
+
+
+async def _get_mcp_session():
+    """Liefert die laufende MCP-Session, baut sie bei Bedarf (einmalig) auf."""
+    global _mcp_session
+    async with _mcp_session_lock:
+        if _mcp_session is None or _mcp_session[0].done():
+            ready = asyncio.get_running_loop().create_future()
+            stop = asyncio.Event()
+            task = asyncio.create_task(_run_mcp_session(ready, stop))
+            session = await ready
+            _mcp_session = (task, stop, session)
+            log.info("MCP-Session zu Port %d aufgebaut", MCP_PORT)
+        return _mcp_session[2]
+
+
+async def _stop_mcp_entry(entry):
+    task, stop, _ = entry
+    stop.set()
+    try:
+        await asyncio.wait_for(task, timeout=5)
+    except asyncio.TimeoutError:
+        task.cancel()
 
-    async with sse_client(url) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, arguments)
-            return result
+
+async def close_mcp_session():
+    """Schließt die persistente MCP-Session (falls offen)."""
+    global _mcp_session
+    async with _mcp_session_lock:
+        entry, _mcp_session = _mcp_session, None
+    if entry:
+        await _stop_mcp_entry(entry)
+
+
+async def _replace_mcp_session(stale):
+    """Ersetzt eine abgebrochene Session und liefert die neue.
+
+    Nur wenn `stale` noch die aktuelle Session ist – hat ein paralleler Aufruf
+    schon neu verbunden, wird dessen frische Session weiterverwendet.
+    """
+    global _mcp_session
+    async with _mcp_session_lock:
+        if _mcp_session is not None and _mcp_session[2] is stale:
+            entry, _mcp_session = _mcp_session, None
+            await _stop_mcp_entry(entry)
+    return await _get_mcp_session()
+
+
+# Tools ohne Seiteneffekt – nur diese dürfen nach Verbindungsabbruch wiederholt werden
+READ_ONLY_TOOLS = frozenset({"browser_snapshot", "browser_tab_list", "browser_take_screenshot"})
+
+
+def _connection_errors() -> tuple[type[BaseException], ...]:
+    """Fehler, die eine abgebrochene SSE-Verbindung anzeigen (keine Tool-Fehler)."""
+    import anyio
+    import httpx
+    return (OSError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, httpx.TransportError)
+
+
+async def mcp_call(tool_name: str, arguments: dict) -> dict:
+    """Ruft ein MCP Tool über die persistente HTTP/SSE-Session auf.
+
+    Bricht die Verbindung ab, wird die Session neu aufgebaut; wiederholt wird
+    der Aufruf nur bei lesenden Tools. Klicks, Eingaben und Navigation könnten
+    bereits ausgeführt sein und werden nicht doppelt abgesetzt.
+    """
+    session = await _get_mcp_session()
+    try:
+        return await session.call_tool(tool_name, arguments)
+    except _connection_errors() as e:
+        if tool_name not in READ_ONLY_TOOLS:
+            log.warning("MCP-Aufruf '%s' abgebrochen (%s), wird nicht wiederholt", tool_name, e)
+            await _replace_mcp_session(session)
+            raise
+        log.warning("MCP-Aufruf '%s' abgebrochen (%s), baue Session neu auf", tool_name, e)
+        session = await _replace_mcp_session(session)
+        return await session.call_tool(tool_name, arguments)
+
+
+def _content_text(result) -> str | None:
+    """Verbindet die Text-Items eines MCP-Ergebnisses (None ohne Content)."""
+    content = getattr(result, "content", None)
+    if not content:
+        return None
+    return "\n".join(text for item in content if (text := getattr(item, "text", None)) is not None)
 
 
 async def navigate(url: str) -> str:
@@ -93,13 +206,10 @@ async def navigate(url: str) -> str:
     result = await mcp_call("browser_snapshot", {})
 
     # Textinhalt extrahieren
-    if hasattr(result, "content") and result.content:
-        texts = []
-        for item in result.content:
-            if hasattr(item, "text"):
-                texts.append(item.text)
-        return "\n".join(texts) if texts else "(kein Inhalt)"
-    return str(result)
+    text = _content_text(result)
+    if text is None:
+        return str(result)
+    return text or "(kein Inhalt)"
 
 
 async def screenshot(url: str = None) -> tuple[bytes | None, str]:
@@ -112,59 +222,44 @@ async def screenshot(url: str = None) -> tuple[bytes | None, str]:
             url = "https://" + url
         await mcp_call("browser_navigate", {"url": url})
 
-    # Screenshot
-    result = await mcp_call("browser_take_screenshot", {})
-    img_bytes = None
-    if hasattr(result, "content") and result.content:
-        for item in result.content:
-            if hasattr(item, "data"):
-                img_bytes = base64.b64decode(item.data)
-                break
-
-    # Snapshot für Text
-    snap = await mcp_call("browser_snapshot", {})
-    snap_text = ""
-    if hasattr(snap, "content") and snap.content:
-        for item in snap.content:
-            if hasattr(item, "text"):
-                snap_text += item.text + "\n"
-
-    return img_bytes, snap_text.strip()
+    # Screenshot und Text-Snapshot derselben Seite parallel anfordern
+    result, snap = await asyncio.gather(
+        mcp_call("browser_take_screenshot", {}),
+        mcp_call("browser_snapshot", {}),
+    )
+    img_bytes = next(
+        (a2b_base64(data) for item in getattr(result, "content", None) or ()
+         if (data := getattr(item, "data", None))),
+        None,
+    )
+    return img_bytes, (_content_text(snap) or "").strip()
 
 
 async def click(element: str) -> str:
     """Klickt auf ein Element (Accessibility-Ref)."""
     await mcp_call("browser_click", {"element": element})
     result = await mcp_call("browser_snapshot", {})
-    if hasattr(result, "content") and result.content:
-        texts = [item.text for item in result.content if hasattr(item, "text")]
-        return "\n".join(texts)
-    return str(result)
+    text = _content_text(result)
+    return text if text is not None else str(result)
 
 
 async def type_text(element: str, text: str) -> str:
     """Tippt Text in ein Eingabefeld."""
     await mcp_call("browser_type", {"element": element, "text": text})
     result = await mcp_call("browser_snapshot", {})
-    if hasattr(result, "content") and result.content:
-        texts = [item.text for item in result.content if hasattr(item, "text")]
-        return "\n".join(texts)
-    return str(result)
+    text = _content_text(result)
+    return text if text is not None else str(result)
 
 
 async def list_tabs() -> str:
     """Listet offene Tabs."""
     result = await mcp_call("browser_tab_list", {})
-    if hasattr(result, "content") and result.content:
-        texts = [item.text for item in result.content if hasattr(item, "text")]
-        return "\n".join(texts)
-    return str(result)
+    text = _content_text(result)
+    return text if text is not None else str(result)
 
 
 async def get_snapshot() -> str:
     """Gibt den aktuellen Seiteninhalt als Accessibility-Snapshot zurück."""
     result = await mcp_call("browser_snapshot", {})
-    if hasattr(result, "content") and result.content:
-        texts = [item.text for item in result.content if hasattr(item, "text")]
-        return "\n".join(texts)
-    return str(result)
+    text = _content_text(result)
+    return text if text is not None else str(result)
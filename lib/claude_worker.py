@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Persistenter Claude-CLI-Prozess pro Session.
+
+Statt für jede Nachricht einen neuen `claude`-Prozess zu starten (Node-Startup,
+MCP-Handshake, Session-Laden), bleibt ein Prozess im stream-json-Modus offen.
+Prompts werden als JSON-Zeilen über stdin geschickt, die Antwort ist das
+`result`-Frame auf stdout.
+"""
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+log = logging.getLogger("telegram_bridge.claude_worker")
+
+STREAM_FLAGS = ("--input-format", "stream-json", "--output-format", "stream-json", "--verbose")
+READ_LIMIT = 16 * 1024 * 1024  # Ein result-Frame enthält die komplette Antwort in einer Zeile
+
+
+class ClaudeWorkerError(RuntimeError):
+    """Der Claude-Prozess ist beendet oder hat das Protokoll verletzt.
+
+    `delivered` ist True, wenn der Prompt Claude bereits erreicht hatte – dann
+    liefen Tool-Aufrufe womöglich schon und der Prompt darf nicht erneut laufen.
+    """
+
+    def __init__(self, message: str, delivered: bool = False):
+        super().__init__(message)
+        self.delivered = delivered
+
+
+class ClaudeWorker:
+    """Langlebiger `claude --print`-Prozess, Anfragen werden per Lock serialisiert."""
+
+    def __init__(self, cmd: list[str], cwd: Path):
+        """
+        Args:
+            cmd: Claude-Befehl ohne Prompt (Session, System-Prompt, Modell, MCP)
+            cwd: Arbeitsverzeichnis des Prozesses
+        """
+        self.cmd = [*cmd, *STREAM_FLAGS]
+        self.cwd = cwd
+        self.proc: asyncio.subprocess.Process | None = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self):
+        """Startet den Claude-Prozess."""
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=str(self.cwd),
+            limit=READ_LIMIT,
+        )
+        log.info("🧵 Claude-Worker gestartet (PID %d)", self.proc.pid)
+
+    async def stop(self):
+        """Beendet den Claude-Prozess (erst SIGTERM, dann SIGKILL)."""
+        if not self.alive:
+            return
+        self.proc.terminate()
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+        log.info("🧵 Claude-Worker beendet (PID %d)", self.proc.pid)
+
+    async def ask(self, prompt: str, timeout: float) -> str:
+        """Schickt einen Prompt und wartet auf das result-Frame.
+
+        Bei Timeout wird der Prozess beendet und `asyncio.TimeoutError` weitergereicht.
+        """
+        async with self.lock:
+            if not self.alive:
+                raise ClaudeWorkerError("Claude-Worker läuft nicht")
+            frame = {"type": "user", "message": {"role": "user", "content": prompt}}
+            try:
+                self.proc.stdin.write(json.dumps(frame).encode("utf-8") + b"\n")
+                await self.proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError) as e:
+                await self.stop()
+                raise ClaudeWorkerError(f"Claude-Worker nicht erreichbar: {e}") from e
+            # Ab hier ist der Prompt zugestellt
+            try:
+                return await asyncio.wait_for(self._read_result(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await self.stop()
+                raise
+            except ClaudeWorkerError:
+                await self.stop()
+                raise
+            except ValueError as e:  # Zeile länger als READ_LIMIT
+                await self.stop()
+                raise ClaudeWorkerError(f"Antwort-Frame des Claude-Workers zu groß: {e}", delivered=True) from e
+
+    async def _read_result(self) -> str:
+        """Liest stdout-Frames bis zum Abschluss des aktuellen Turns."""
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                raise ClaudeWorkerError(
+                    f"Claude-Worker unerwartet beendet (exit={self.proc.returncode})", delivered=True
+                )
+            try:
+                frame = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if frame.get("type") != "result":
+                continue
+            if frame.get("is_error") or "result" not in frame:
+                detail = frame.get("result") or frame.get("subtype") or "ohne Ergebnis"
+                raise ClaudeWorkerError(f"Claude meldet Fehler: {detail}", delivered=True)
+            return (frame["result"] or "").strip()
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""Lädt die .env des Projekts genau einmal pro Prozess.
+
+Module, die Umgebungsvariablen lesen, importieren dieses Modul statt selbst
+`load_dotenv()` aufzurufen – Python führt es nur beim ersten Import aus.
+Bereits gesetzte Variablen (z.B. aus systemd) haben Vorrang.
+"""
+
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+PROJECT_DIR = Path(__file__).parent.parent
+ENV_FILE = PROJECT_DIR / ".env"
+
+load_dotenv(ENV_FILE, override=False)
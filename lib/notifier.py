@@ -5,13 +5,21 @@ import os
 import sys
 import requests
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import BinaryIO
+from requests.adapters import HTTPAdapter
 
-load_dotenv(Path(__file__).parent.parent / ".env")
+try:
+    from lib import env  # noqa: F401  (lädt .env)
+except ImportError:  # Direkt als Skript gestartet: python lib/notifier.py
+    import env  # noqa: F401
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# Eine Session für alle Aufrufe: Keep-Alive spart den TLS-Handshake pro Chunk
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
 
 def send_message(text: str, parse_mode: str = None) -> bool:
     """Sendet eine Nachricht an den konfigurierten Telegram-Chat."""
@@ -21,23 +29,38 @@ def send_message(text: str, parse_mode: str = None) -> bool:
         payload = {"chat_id": CHAT_ID, "text": chunk}
         if parse_mode:
             payload["parse_mode"] = parse_mode
-        resp = requests.post(url, json=payload, timeout=10)
+        resp = _SESSION.post(url, json=payload, timeout=10)
         if not resp.ok:
             print(f"Telegram-Fehler: {resp.text}", file=sys.stderr)
             return False
     return True
 
 
-def send_photo(photo_path: str, caption: str = "") -> bool:
-    """Sendet ein Foto an den konfigurierten Telegram-Chat."""
+def send_photo(photo: str | Path | bytes | BinaryIO, caption: str = "", filename: str = None) -> bool:
+    """Sendet ein Foto an den konfigurierten Telegram-Chat.
+
+    `photo` ist ein Dateipfad oder direkt der Bildinhalt (bytes / Datei-Objekt),
+    z.B. ein Screenshot aus dem Speicher – ohne Umweg über eine temporäre Datei.
+    Ohne `filename` wird der Name des Pfads bzw. Datei-Objekts verwendet,
+    für reine bytes "photo.png".
+    """
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendPhoto"
-    with open(photo_path, "rb") as f:
-        resp = requests.post(
-            url,
-            data={"chat_id": CHAT_ID, "caption": caption},
-            files={"photo": f},
-            timeout=30,
-        )
+    if isinstance(photo, (str, Path)):
+        with open(photo, "rb") as f:
+            return _post_photo(url, f, caption, filename or Path(photo).name)
+    if filename is None:
+        name = getattr(photo, "name", None)
+        filename = Path(name).name if isinstance(name, str) else "photo.png"
+    return _post_photo(url, photo, caption, filename)
+
+
+def _post_photo(url: str, photo: bytes | BinaryIO, caption: str, filename: str) -> bool:
+    resp = _SESSION.post(
+        url,
+        data={"chat_id": CHAT_ID, "caption": caption},
+        files={"photo": (filename, photo)},
+        timeout=30,
+    )
     return resp.ok
 
 
@@ -10,12 +10,16 @@ Läuft als asyncio-Task im Bot-Event-Loop.
 """
 
 import asyncio
+import contextlib
 import json
 import logging
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Callable, Optional
 
+import orjson
+
 log = logging.getLogger("telegram_bridge.scheduler")
 
 WORKING_DIR = Path(__file__).parent.parent
@@ -33,36 +37,46 @@ class TaskScheduler:
         self,
         build_claude_cmd_fn: Callable,
         send_message_fn: Callable,
+        claude_semaphore: Optional[asyncio.Semaphore] = None,
     ):
         """
         Args:
             build_claude_cmd_fn: Referenz zu build_claude_cmd() aus bot.py
             send_message_fn:     Async callable(text) um Telegram-Nachricht zu senden
+            claude_semaphore:    Gemeinsames Limit für gleichzeitige Claude-Prozesse (optional)
         """
         self.build_claude_cmd = build_claude_cmd_fn
         self.send_message = send_message_fn
+        self.claude_sem = claude_semaphore or contextlib.nullcontext()
         self._task: Optional[asyncio.Task] = None
         self._state: dict = {}
+        self._agents_stat: Optional[tuple] = None  # (mtime_ns, size) der gecachten agents.json
+        self._agents: dict = {}
 
     # ------------------------------------------------------------------ #
     #  Config & State I/O                                                  #
     # ------------------------------------------------------------------ #
 
     def _load_agents(self) -> dict:
-        """Lade agents.json (bei jedem Zyklus neu → Hot-Reload)."""
-        if not AGENTS_FILE.exists():
-            return {}
-        with open(AGENTS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        """Lade agents.json (nur bei geänderter mtime/Größe neu → Hot-Reload)."""
+        try:
+            st = AGENTS_FILE.stat()
+        except FileNotFoundError:
+            self._agents_stat, self._agents = None, {}
+            return self._agents
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self._agents_stat:
+            self._agents = orjson.loads(AGENTS_FILE.read_bytes())
+            self._agents_stat = key
+        return self._agents
 
     def _load_state(self) -> dict:
         """Lade Ausführungs-State aus data/scheduler_state.json."""
-        if not STATE_FILE.exists():
-            return {}
         try:
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, OSError):
+            return orjson.loads(STATE_FILE.read_bytes())
+        except FileNotFoundError:
+            return {}
+        except (ValueError, OSError):
             log.warning("scheduler_state.json beschädigt, starte neu")
             return {}
 
@@ -170,7 +184,7 @@ class TaskScheduler:
             task_id, task_type, agent_emoji, agent_name,
         )
 
-        start = datetime.now()
+        start = time.perf_counter()
 
         try:
             if task_type == "bash":
@@ -185,26 +199,35 @@ class TaskScheduler:
                 stdout, stderr = await asyncio.wait_for(
                     proc.communicate(), timeout=timeout
                 )
-                elapsed = (datetime.now() - start).total_seconds()
-                output = stdout.decode().strip()
-                if stderr.decode().strip():
-                    output += f"\n--- STDERR ---\n{stderr.decode().strip()}"
+                elapsed = time.perf_counter() - start
+                output = stdout.decode(errors="replace").strip()
+                err = stderr.decode(errors="replace").strip()
+                if err:
+                    output += f"\n--- STDERR ---\n{err}"
             else:
                 # ---- Claude-Task: Standard-Ausführung ----
                 cmd = self.build_claude_cmd(prompt, agent, "scheduler")
-                proc = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=str(WORKING_DIR),
-                )
-                stdout, stderr = await asyncio.wait_for(
-                    proc.communicate(), timeout=timeout
-                )
-                elapsed = (datetime.now() - start).total_seconds()
-                output = stdout.decode().strip()
-                if stderr.decode().strip():
-                    output += f"\n\n--- STDERR ---\n{stderr.decode().strip()}"
+                async with self.claude_sem:
+                    proc = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                        cwd=str(WORKING_DIR),
+                    )
+                    try:
+                        stdout, stderr = await asyncio.wait_for(
+                            proc.communicate(), timeout=timeout
+                        )
+                    except asyncio.TimeoutError:
+                        # Semaphore-Slot erst freigeben, wenn Claude wirklich beendet ist
+                        proc.kill()
+                        await proc.wait()
+                        raise
+                elapsed = time.perf_counter() - start
+                output = stdout.decode(errors="replace").strip()
+                err = stderr.decode(errors="replace").strip()
+                if err:
+                    output += f"\n\n--- STDERR ---\n{err}"
 
             # State aktualisieren
             self._state.setdefault(task_id, {"run_count": 0})
@@ -241,7 +264,7 @@ class TaskScheduler:
             )
 
         except asyncio.TimeoutError:
-            elapsed = (datetime.now() - start).total_seconds()
+            elapsed = time.perf_counter() - start
             log.error("⏱️ Scheduler: Task '%s' Timeout nach %ds", task_id, timeout)
             self._state.setdefault(task_id, {}).update({
                 "last_run": datetime.now().isoformat(),
@@ -254,7 +277,7 @@ class TaskScheduler:
             )
 
         except Exception as e:
-            elapsed = (datetime.now() - start).total_seconds()
+            elapsed = time.perf_counter() - start
             log.exception("❌ Scheduler: Fehler bei Task '%s': %s", task_id, e)
             self._state.setdefault(task_id, {}).update({
                 "last_run": datetime.now().isoformat(),
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Aufbereitung von Texten für Telegram: Aufteilen in Nachrichten und Zusammenfügen.
+
+Reine Funktionen ohne Bot-Abhängigkeiten – Telegram misst das 4096-Zeichen-Limit
+in UTF-16-Einheiten, Code-Blöcke (```) bleiben über Teilgrenzen hinweg paarig.
+"""
+
+# Ab dieser Länge gilt eine Nachricht als vom Client gesplitteter Teil eines langen Textes
+LONG_MESSAGE_CHARS = 4000
+
+
+def utf16_len(text: str) -> int:
+    """Länge in UTF-16-Einheiten – so zählt Telegram das 4096-Zeichen-Limit (Emoji = 2)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _utf16_cut(text: str, i: int, j: int, limit: int) -> int:
+    """Kürzt das Ende j, bis text[i:j] höchstens `limit` UTF-16-Einheiten lang ist."""
+    while (excess := utf16_len(text[i:j]) - limit) > 0:
+        j -= (excess + 1) // 2  # jedes Zeichen zählt 1 oder 2 Einheiten
+    return j
+
+
+SPLIT_PARAGRAPH_WINDOW = 512  # Trennstellen nur so nah am Limit suchen – keine Mini-Teile
+CODE_FENCE = "```"
+FENCE_RESERVE = 8  # Platz für schließenden/öffnenden Fence an einer Teilgrenze
+
+
+def _split_raw(text: str, limit: int):
+    """Zerlegt Text an Absatz-, Zeilen- oder Wortgrenzen in Teile von höchstens `limit` UTF-16-Einheiten.
+
+    Gesucht wird in den letzten SPLIT_PARAGRAPH_WINDOW Zeichen vor dem Limit,
+    erst nach Leerzeile, dann Zeilenumbruch, dann Leerzeichen; sonst harter Schnitt.
+    Die Teile bleiben unverändert (keine Fence-Korrektur), Trennzeichen an der
+    Schnittstelle entfallen.
+    """
+    i, n = 0, len(text)
+    while i < n:
+        j = _utf16_cut(text, i, min(i + limit, n), limit)
+        skip = 0
+        if j < n:
+            lo = max(i, j - SPLIT_PARAGRAPH_WINDOW)
+            for sep in ("\n\n", "\n", " "):
+                k = text.rfind(sep, lo, j)
+                if k > i:
+                    j, skip = k, len(sep)
+                    break
+            else:
+                # Harter Schnitt: trifft er zufällig ein Trennzeichen, dieses nicht übernehmen
+                skip = 1 if text[j] in " \n" else 0
+        yield text[i:j]
+        i = j + skip
+
+
+def _fence_wrap(chunk: str, in_fence: bool) -> tuple[str, bool]:
+    """Öffnet einen an der Teilgrenze angeschnittenen Code-Block wieder und schließt ihn am Ende.
+
+    Returns:
+        (Nachricht, ob der nächste Teil innerhalb eines Code-Blocks beginnt)
+    """
+    if in_fence:
+        chunk = f"{CODE_FENCE}\n{chunk}"
+    in_fence = chunk.count(CODE_FENCE) % 2 == 1
+    if in_fence:
+        chunk += f"\n{CODE_FENCE}"
+    return chunk, in_fence
+
+
+def split_text(text: str, limit: int = 4000):
+    """Zerlegt Text in Telegram-taugliche Teile.
+
+    Getrennt wird bevorzugt an einer Absatzgrenze kurz vor dem Limit, sonst an
+    Zeilen- oder Wortgrenzen. Wird ein Code-Block (```) angeschnitten, wird er
+    am Ende des Teils geschlossen und im nächsten wieder geöffnet.
+
+    `limit` gilt in UTF-16-Einheiten, damit auch Emoji-lastige Antworten unter
+    dem Telegram-Limit bleiben.
+    """
+    if CODE_FENCE not in text:
+        yield from _split_raw(text, limit)
+        return
+    in_fence = False
+    for chunk in _split_raw(text, limit - FENCE_RESERVE):
+        chunk, in_fence = _fence_wrap(chunk, in_fence)
+        yield chunk
+
+
+def stderr_suffix(stderr: bytes) -> str:
+    err = stderr.decode(errors="replace").strip()
+    return f"\n\n--- STDERR ---\n{err}" if err else ""
+
+
+def join_prompts(prompts: list[str]) -> str:
+    """Fügt gesammelte Nachrichten zusammen; vom Client gesplittete Teile ohne Trenner."""
+    parts = [prompts[0]]
+    for prev, cur in zip(prompts, prompts[1:]):
+        if len(prev) < LONG_MESSAGE_CHARS:
+            parts.append("\n")
+        parts.append(cur)
+    return "".join(parts)
+
+
+class ChunkedReply:
+    """Sendet Claude-Ausgabe in Telegram-Teilen, sobald ein voller Teil vorliegt.
+
+    Ab `soft_limit` Zeichen wird bevorzugt an einer Absatzgrenze (Leerzeile)
+    außerhalb von Code-Blöcken gesendet, spätestens bei `limit` über `_split_raw()`.
+
+    Der letzte (evtl. unvollständige) Teil bleibt gepuffert, bis `finish()`
+    aufgerufen wird. Wurde nichts gestreamt (Cache, persistenter Worker),
+    sendet `finish()` die komplette Antwort.
+    """
+
+    def __init__(self, send, limit: int = 4000, soft_limit: int = 3500):
+        self.send = send
+        self.limit = limit
+        self.soft_limit = soft_limit  # ab hier an der letzten Absatzgrenze senden
+        self.sent = 0
+        self._buf = ""          # noch nicht gesendeter Rohtext (ohne Fence-Korrektur)
+        self._in_fence = False  # _buf beginnt innerhalb eines Code-Blocks
+        self._stderr = ""
+
+    def _budget(self, text: str) -> int:
+        if self._in_fence or CODE_FENCE in text:
+            return self.limit - FENCE_RESERVE
+        return self.limit
+
+    async def _send_part(self, raw: str):
+        message, self._in_fence = _fence_wrap(raw, self._in_fence)
+        await self.send(message)
+        self.sent += 1
+
+    def _paragraph_break(self) -> int | None:
+        """Letzte Leerzeile nahe `soft_limit` außerhalb eines Code-Blocks.
+
+        Gesucht wird erst ab `soft_limit - SPLIT_PARAGRAPH_WINDOW`, damit kein
+        Mini-Teil verschickt wird; liegt ein Kandidat in einem Code-Block, wird
+        der davor geprüft. Ohne Treffer trennt `_split_raw()` am Limit.
+        """
+        lo = max(1, self.soft_limit - SPLIT_PARAGRAPH_WINDOW)
+        k = self._buf.rfind("\n\n", lo)
+        while k >= lo:
+            if (self._in_fence + self._buf.count(CODE_FENCE, 0, k)) % 2 == 0:
+                return k
+            k = self._buf.rfind("\n\n", lo, k)
+        return None
+
+    async def feed(self, text: str):
+        self._buf += text
+        if not self.sent:
+            self._buf = self._buf.lstrip()
+        size = utf16_len(self._buf)
+        if size <= self.soft_limit:
+            return
+        if size <= self.limit:
+            k = self._paragraph_break()
+            if k is not None:
+                head, self._buf = self._buf[:k], self._buf[k + 2:]
+                await self._send_part(head)
+            return
+        *full, self._buf = _split_raw(self._buf, self._budget(self._buf))
+        for chunk in full:
+            await self._send_part(chunk)
+
+    def set_stderr(self, stderr: bytes):
+        self._stderr = stderr_suffix(stderr)
+
+    async def finish(self, output: str):
+        rest = (self._buf.rstrip() + self._stderr) if self.sent else output
+        self._buf = ""
+        if not rest.strip():
+            if not self.sent:
+                await self.send("(keine Ausgabe)")
+            return
+        for chunk in _split_raw(rest, self._budget(rest)):
+            await self._send_part(chunk)
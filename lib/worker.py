@@ -4,18 +4,34 @@
 import logging
 import os
 from datetime import datetime
-from pathlib import Path
 
-import requests as http_requests
-from dotenv import load_dotenv
+import httpx
 
-load_dotenv(Path(__file__).parent.parent / ".env")
+from lib import env  # noqa: F401  (lädt .env)
 
 log = logging.getLogger("telegram_bridge.worker")
 
 WORKER_BOT_TOKEN = os.getenv("TELEGRAM_WORKER_BOT_TOKEN", "")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
 
+# Ein Client für alle Requests (Keep-Alive); wird im Event-Loop des Bots erzeugt
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=5.0, limits=httpx.Limits(max_connections=4))
+    return _client
+
+
+async def close_client():
+    """Schließt den HTTP-Client (Bot-Shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 async def log_request(user: str, request_type: str, content: str, agent: str = "Assistant"):
     """Sendet eine formatierte Request-Info über den Worker-Bot."""
@@ -39,8 +55,8 @@ async def log_request(user: str, request_type: str, content: str, agent: str = "
     payload = {"chat_id": CHAT_ID, "text": text}
 
     try:
-        resp = http_requests.post(url, json=payload, timeout=5)
-        if not resp.ok:
+        resp = await _get_client().post(url, json=payload)
+        if not resp.is_success:
             log.warning("Worker-Bot Fehler: %s", resp.text)
-    except Exception as e:
+    except Exception as e:  # Best-Effort: Log-Fehler dürfen den eigentlichen Befehl nie abbrechen
         log.warning("Worker-Bot nicht erreichbar: %s", e)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test lib/telegram_text.py
+Prüft das Aufteilen von Antworten in Telegram-Nachrichten (UTF-16-Limit,
+Absatzgrenzen, Code-Blöcke) und das Zusammenfügen gebündelter Nachrichten.
+Reine Funktionen – der Bot wird dafür nicht importiert.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add project to path
+PROJECT_DIR = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from lib.telegram_text import (
+    CODE_FENCE,
+    LONG_MESSAGE_CHARS,
+    SPLIT_PARAGRAPH_WINDOW,
+    ChunkedReply,
+    _utf16_cut,
+    join_prompts,
+    split_text,
+    utf16_len,
+)
+
+FENCED_OUTPUT = (
+    "Hier ist der Code:\n\n```python\n"
+    + "".join(f"print({i})\n" for i in range(1200))
+    + "```\n\nFertig. " + "wort " * 500
+    + "\n\n```\nnoch mehr\n```\n"
+)
+
+
+def _stream(text: str, piece: int) -> list[str]:
+    """Füttert `text` in Stücken der Größe `piece` in ChunkedReply und liefert die gesendeten Nachrichten."""
+    sent: list[str] = []
+
+    async def send(message: str):
+        sent.append(message)
+
+    async def run():
+        reply = ChunkedReply(send)
+        for i in range(0, len(text), piece):
+            await reply.feed(text[i:i + piece])
+        await reply.finish(text)
+
+    asyncio.run(run())
+    return sent
+
+
+def test_utf16_cut_respects_limit():
+    """Emoji zählen doppelt – der Schnitt landet nie über dem Limit."""
+    text = "a😀" * 3000
+    j = _utf16_cut(text, 0, 4000, 4000)
+    assert 3998 <= utf16_len(text[:j]) <= 4000
+
+
+def test_emoji_only_text_stays_within_telegram_limit():
+    text = "😀" * 9000
+    parts = list(split_text(text))
+    assert all(utf16_len(p) <= 4000 for p in parts), [utf16_len(p) for p in parts]
+    assert "".join(parts) == text
+
+
+def test_paragraph_split_inside_window():
+    """Eine Leerzeile kurz vor dem Limit wird dem harten Schnitt vorgezogen."""
+    head = "a" * (4000 - SPLIT_PARAGRAPH_WINDOW // 2)
+    parts = list(split_text(head + "\n\n" + "b" * 1000))
+    assert parts == [head, "b" * 1000]
+
+
+def test_code_fence_closed_and_reopened_across_parts():
+    text = "```\n" + "x = 1\n" * 1500 + "```"
+    parts = list(split_text(text))
+    assert len(parts) > 1
+    assert all(p.count(CODE_FENCE) % 2 == 0 for p in parts)
+    assert parts[0].endswith(f"\n{CODE_FENCE}")
+    assert all(p.startswith(f"{CODE_FENCE}\n") for p in parts[1:])
+    assert all(utf16_len(p) <= 4000 for p in parts)
+
+
+def test_join_prompts():
+    """Vom Client gesplittete Teile (≥ LONG_MESSAGE_CHARS) werden ohne Trenner verbunden."""
+    long_part = "a" * LONG_MESSAGE_CHARS
+    assert join_prompts([long_part, "b"]) == long_part + "b"
+    assert join_prompts(["hallo", "welt"]) == "hallo\nwelt"
+    assert join_prompts(["nur eine"]) == "nur eine"
+
+
+def test_streamed_code_fences_stay_balanced():
+    """Jede gestreamte Nachricht enthält eine gerade Anzahl ``` und passt ins Telegram-Limit."""
+    for piece in (7, 300, 1000, 65536):
+        sent = _stream(FENCED_OUTPUT, piece)
+        counts = [m.count(CODE_FENCE) for m in sent]
+        assert all(c % 2 == 0 for c in counts), f"Stückgröße {piece}: {counts}"
+        assert all(utf16_len(m) <= 4000 for m in sent), f"Stückgröße {piece}: Limit überschritten"
+        joined = "".join(sent)
+        assert all(f"print({i})" in joined for i in range(1200)), f"Stückgröße {piece}: Zeilen fehlen"
+
+
+def test_streamed_paragraph_flush_skips_tiny_head():
+    """Eine Leerzeile weit vor `soft_limit` erzeugt keine Mini-Nachricht."""
+    sent = _stream("Intro:\n\n" + "wort " * 900, 50)
+    assert len(sent[0]) > 3500 - SPLIT_PARAGRAPH_WINDOW
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")